@@ -0,0 +1,78 @@
+import operator
+
+# ------------------------------------------------------------
+#                    ACHIEVEMENT RULES
+# ------------------------------------------------------------
+# Achievements are data: every entry in achievements.json can have a rule
+#   "rule": {"on": "level_completed", "if": [["duration", "<=", 30], ["mode", "==", "endless"]]}
+# The game only calls emit() when something happens. Rules are indexed by the
+# event they listen to and leave the index once unlocked, so a finished rule
+# (or an event nobody listens to) costs nothing.
+#
+# Events and their fields:
+#   coin_collected   score, combo, total_coins, level
+#   combo_changed    combo
+#   level_completed  level, next_level, duration, obstacles_touched, mode
+#   boss_spawned     level, mode
+#   boss_defeated    level, mode
+#   run_ended        reason ("game_over"/"time_over"), score, level, mode, difficulty, time_limit
+EVENTS = ("coin_collected", "combo_changed", "level_completed", "boss_spawned", "boss_defeated", "run_ended")
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">=": operator.ge,
+    ">": operator.gt,
+    "<=": operator.le,
+    "<": operator.lt,
+}
+
+
+def compile_rule(rule):
+    # {"on": ..., "if": [[field, op, value], ...]} -> (event, [(field, op function, value)])
+    event = rule["on"]
+    if event not in EVENTS:
+        raise ValueError(f"unknown event {event!r}")
+    conditions = []
+    for field, op, value in rule.get("if", ()):
+        if op not in OPERATORS:
+            raise ValueError(f"unknown operator {op!r}")
+        conditions.append((field, OPERATORS[op], value))
+    return event, conditions
+
+
+class AchievementEngine:
+    def __init__(self, achievements):
+        # achievements: key -> {"unlocked", "rule", ...}, unlocked is set in place
+        self.achievements = achievements
+        self.rules = {}  # event -> [(key, conditions)], only rules that can still unlock
+        for key, achievement in achievements.items():
+            rule = achievement.get("rule")
+            if achievement.get("unlocked") or not rule:
+                continue
+            try:
+                event, conditions = compile_rule(rule)
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"Achievement {key} has an invalid rule: {e}")
+                continue
+            self.rules.setdefault(event, []).append((key, conditions))
+
+    def emit(self, event, fields):
+        # Returns the keys of the achievements this event unlocked
+        rules = self.rules.get(event)
+        if not rules:
+            return ()
+        unlocked = []
+        for key, conditions in rules:
+            for field, op, value in conditions:
+                if field not in fields or not op(fields[field], value):
+                    break
+            else:
+                unlocked.append(key)
+        if unlocked:
+            self.rules[event] = [rule for rule in rules if rule[0] not in unlocked]
+            if not self.rules[event]:
+                del self.rules[event]
+            for key in unlocked:
+                self.achievements[key]["unlocked"] = True
+        return unlocked
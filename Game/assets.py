@@ -0,0 +1,94 @@
+import time
+
+import pygame
+
+from rendering import SpriteAtlas, surface_bytes
+
+
+# ------------------------------------------------------------
+#                         ASSETS
+# ------------------------------------------------------------
+# Sprites, sounds and fonts are registered by name with a function that loads
+# them, nothing is read from disk until the first get(). Names registered with
+# the same key (same file, same size) share one load. Every load is timed and
+# measured: report() prints what has been loaded so far, later loads print a
+# line each, so a slow asset shows up in the log instead of as a slow start.
+class AssetManager:
+    def __init__(self, tracer=None):
+        self.tracer = tracer  # Optional tracing.Tracer, every load shows up as a span
+        self.loaders = {}  # name -> (key, load, fallback)
+        self.assets = {}  # name -> loaded asset
+        self.shared = {}  # key -> loaded asset, for names that load the same thing
+        self.loads = []  # (name, ms, bytes) in load order, shared loads are not repeated
+        self.nested = []  # Time spent in loads inside the running load, per level
+        self.log_loads = False  # Print every load, on after the startup report
+
+    def register(self, name, load, key=None, fallback=None):
+        # load() -> asset. key: names with equal keys share one load (default: every name its own).
+        # fallback() -> asset used when load() raises, without one the error is passed on.
+        self.loaders[name] = (name if key is None else key, load, fallback)
+
+    def get(self, name):
+        if name in self.assets:
+            return self.assets[name]
+        key, load, fallback = self.loaders[name]
+        if key in self.shared:
+            asset = self.shared[key]
+        else:
+            asset = self._load(name, load, fallback)
+            self.shared[key] = asset
+        self.assets[name] = asset
+        return asset
+
+    __getitem__ = get
+
+    def prefetch(self, names):
+        # Load now what the next screen needs, so its first frame doesn't wait for the disk
+        for name in names:
+            self.get(name)
+
+    def _load(self, name, load, fallback):
+        self.nested.append(0)
+        start = time.perf_counter_ns()
+        try:
+            asset = load()
+        except Exception as e:
+            if fallback is None:
+                raise
+            print(f"Could not load {name}: {e}")
+            asset = fallback()
+        finally:
+            duration = time.perf_counter_ns() - start
+            nested = self.nested.pop()
+            if self.nested:
+                self.nested[-1] += duration
+        if self.tracer is not None:
+            self.tracer.complete("load " + name, "assets", start, duration)
+        # Assets loaded inside this one (empty_heart uses heart) are counted on their own line
+        ms = (duration - nested) / 1e6
+        size = asset_bytes(asset)
+        self.loads.append((name, ms, size))
+        if self.log_loads:
+            print(f"Loaded {name}: {ms:.1f} ms, {size / 1024:.0f} KB")
+        return asset
+
+    def report(self, title):
+        print(f"{title}: {len(self.loads)} of {len(self.loaders)} assets loaded")
+        for name, ms, size in self.loads:
+            print(f"  {name:<16}{ms:>8.1f} ms{size / 1024:>8.0f} KB")
+        total_ms = sum(load[1] for load in self.loads)
+        total_size = sum(load[2] for load in self.loads)
+        print(f"  {'total':<16}{total_ms:>8.1f} ms{total_size / 1024:>8.0f} KB")
+        self.log_loads = True
+
+
+def asset_bytes(asset):
+    # Memory an asset holds, 0 for anything that isn't a surface, sound or atlas
+    if isinstance(asset, pygame.Surface):
+        return surface_bytes(asset)  # Atlas sprites are views into the atlas sheet, counted there too
+    if isinstance(asset, SpriteAtlas):
+        return surface_bytes(asset.sheet) if asset.sheet is not None else 0
+    if isinstance(asset, pygame.mixer.Sound):
+        frequency, sample_format, channels = pygame.mixer.get_init()
+        return int(asset.get_length() * frequency) * channels * abs(sample_format) // 8
+    return 0
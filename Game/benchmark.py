@@ -0,0 +1,237 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import core
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ------------------------------------------------------------
+#                    BENCHMARK SCENARIOS
+# ------------------------------------------------------------
+# python benchmark.py [scenario ...] [--out results.json] [--compare old.json]
+# Every scenario runs the real game (main.py --benchmark <name> <result file>) in its
+# own process with the SDL dummy drivers, so peak memory is per scenario.
+# Each frame simulates exactly 1/60 s and rendering is uncapped, so every run does the
+# same work and only the time it takes differs between machines and commits
+# (timing.FRAME_DT).
+SEED = 12345
+
+
+def sweep_inputs(tick):
+    # Scripted path: back and forth over the whole screen, one row lower every pass
+    row_ticks = 340  # Left to right at normal speed
+    step_ticks = 20
+    rows = 12
+    leg, t = divmod(tick, row_ticks + step_ticks)
+    if t < row_ticks:
+        return core.INPUT_RIGHT if leg % 2 == 0 else core.INPUT_LEFT
+    return core.INPUT_DOWN if (leg // rows) % 2 == 0 else core.INPUT_UP
+
+
+def idle_inputs(tick):
+    return 0
+
+
+def setup_max_obstacles(game):
+    # Level 30 layout with the most obstacles a level can get
+    game.level = 30
+    layout = core.generate_level(game, 20, 15 + 5 + game.level, game.player.rect)
+    core.set_level(game, *layout)
+    core.queue_next_level(game)
+
+
+def setup_boss_spam(game):
+    # Boss that attacks 30 times a second and does not die
+    game.level = 5
+    game.boss = core.Boss(game, game.boss_size)
+    game.boss.hp = game.boss.max_hp = 10**6
+    game.boss.attack_interval = 1 / 30
+    core.set_level(game, [], [])
+
+
+def particle_burst(frame, particle_engine):
+    # 10k particles every 2 s, they are gone well before the next burst
+    if frame % 120 == 0:
+        particle_engine.emit(core.WIDTH // 2, core.HEIGHT // 2, 10000, color_range=((200, 255), (100, 200), (0, 50)),
+                             speed=(1, 8), size=(2, 6), lifetime=(20, 40))
+
+
+class Scenario:
+    def __init__(self, frames, mode="endless", time_limit=600, inputs=sweep_inputs, setup=None, per_frame=None):
+        self.frames = frames
+        self.mode = mode  # None stays in the menu
+        self.time_limit = time_limit
+        self.inputs = inputs  # tick -> INPUT_* mask
+        self.setup = setup  # setup(game) after the GameState is created
+        self.per_frame = per_frame  # per_frame(frame, particle_engine)
+
+
+SCENARIOS = {
+    "menu_idle": Scenario(600, mode=None),
+    "time_attack_60s": Scenario(3590, mode="time_attack", time_limit=60),  # Time runs out at frame 3600
+    "endless_level_30": Scenario(1800, setup=setup_max_obstacles),
+    "boss_projectile_spam": Scenario(1800, setup=setup_boss_spam),
+    "particle_burst_10k": Scenario(1200, inputs=idle_inputs, per_frame=particle_burst),
+}
+
+
+# ------------------------------------------------------------
+#                  IN-GAME BENCHMARK RUN
+# ------------------------------------------------------------
+# Used by main.py --benchmark: supplies the game, its inputs and a fixed frame
+# time, measures how long every frame really took and writes the result.
+class BenchmarkRun:
+    def __init__(self, name, out_path):
+        self.name = name
+        self.scenario = SCENARIOS[name]
+        self.out_path = out_path
+        self.ticks = 0
+        self.frame = 0
+        self.frame_times = np.zeros(self.scenario.frames, dtype=np.int64)
+        self.last = None
+        self.start = None
+
+    def new_game(self, boss_size, pregen=None):
+        scenario = self.scenario
+        game = core.GameState(scenario.mode, scenario.time_limit, "normal", seed=SEED,
+                              boss_size=boss_size, pregen=pregen)
+        game.invulnerable = True  # The scenario has to last all its frames
+        if scenario.setup:
+            scenario.setup(game)
+        return game
+
+    def inputs(self):
+        # Input for one simulation tick
+        inputs = self.scenario.inputs(self.ticks)
+        self.ticks += 1
+        return inputs
+
+    def end_frame(self, particle_engine):
+        # Returns False once all frames are done
+        now = time.perf_counter_ns()
+        if self.last is None:
+            self.start = now  # The first frame loads assets, it is not measured
+        else:
+            self.frame_times[self.frame] = now - self.last
+            self.frame += 1
+        self.last = now
+        if self.scenario.per_frame:
+            self.scenario.per_frame(self.frame, particle_engine)
+        return self.frame < self.scenario.frames
+
+    def finish(self):
+        frame_ms = self.frame_times[:self.frame] / 1e6
+        total = (self.last - self.start) / 1e9
+        p50, p95, p99 = np.percentile(frame_ms, (50, 95, 99))
+        result = {
+            "frames": int(self.frame),
+            "ticks": self.ticks,
+            "fps": self.frame / total if total > 0 else 0,
+            "frame_ms": {"mean": float(frame_ms.mean()), "p50": float(p50), "p95": float(p95),
+                         "p99": float(p99), "max": float(frame_ms.max())},
+            "peak_memory_mb": peak_memory_mb(),
+        }
+        with open(self.out_path, "w") as f:
+            json.dump(result, f)
+
+
+def peak_memory_mb():
+    # Peak resident memory of this process, None where the resource module is missing (Windows)
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10  # macOS: bytes, Linux: KiB
+
+
+# ------------------------------------------------------------
+#                          RUNNER
+# ------------------------------------------------------------
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_scenario(name):
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy")
+    fd, out_path = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    try:
+        process = subprocess.run([sys.executable, os.path.join(BASE_DIR, "main.py"), "--benchmark", name, out_path],
+                                 cwd=BASE_DIR, env=env, capture_output=True, text=True)
+        if process.returncode != 0:
+            raise RuntimeError(f"Scenario {name} failed:\n{process.stdout}{process.stderr}")
+        with open(out_path) as f:
+            return json.load(f)
+    finally:
+        os.remove(out_path)
+
+
+def print_results(scenarios, baseline=None):
+    print(f"{'scenario':<24}{'fps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'peak MB':>9}")
+    for name, result in scenarios.items():
+        frame_ms = result["frame_ms"]
+        memory = result["peak_memory_mb"]
+        print(f"{name:<24}{result['fps']:>9.1f}{frame_ms['p50']:>9.2f}{frame_ms['p95']:>9.2f}"
+              f"{frame_ms['p99']:>9.2f}{frame_ms['max']:>9.2f}{'-' if memory is None else round(memory, 1):>9}")
+        old = baseline.get(name) if baseline else None
+        if old:
+            # Positive is better for fps, negative is better for frame times
+            memory_change = percent(memory, old["peak_memory_mb"]) if memory is not None else "-"
+            print(f"{'  vs baseline':<24}{percent(result['fps'], old['fps']):>9}"
+                  + "".join(f"{percent(frame_ms[key], old['frame_ms'][key]):>9}" for key in ("p50", "p95", "p99", "max"))
+                  + f"{memory_change:>9}")
+
+
+def percent(new, old):
+    return f"{(new - old) / old * 100:+.1f}%" if old else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless benchmarks of the real game loop")
+    parser.add_argument("scenarios", nargs="*", help=f"default: all of {', '.join(SCENARIOS)}")
+    parser.add_argument("--out", help="write the results as JSON")
+    parser.add_argument("--compare", help="JSON of an earlier run to compare against")
+    args = parser.parse_args()
+
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(unknown)}")
+
+    results = {
+        "commit": git_commit(),
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scenarios": {},
+    }
+    for name in names:
+        print(f"Running {name}...", flush=True)
+        results["scenarios"][name] = run_scenario(name)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["scenarios"]
+    print_results(results["scenarios"], baseline)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
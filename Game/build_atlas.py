@@ -0,0 +1,83 @@
+import json
+import os
+
+import pygame
+
+from rendering import source_hash
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SPRITES_DIR = os.path.join(BASE_DIR, "sprites")
+
+# ---- ATLAS CONTENTS ----
+# name -> (file, in-game size or None to keep the original size)
+# The sizes must match the ones main.py asks for, otherwise it falls back to the single file.
+# player_walk and boss are sheets that main.py cuts into frames and scales itself, so they
+# are packed at their original size.
+ATLAS_SPRITES = {
+    "cactus": ("cactus_sprite.png", (50, 50)),
+    "coin": ("coin_sprite.png", (50, 50)),
+    "heart": ("heart_sprite.png", (30, 30)),
+    "player_walk": ("player_walk.png", None),
+    "player_shadow": ("player_shadow.png", None),
+    "boss": ("boss_sprite.png", None),
+}
+ATLAS_IMAGE = "atlas.png"
+ATLAS_INDEX = "atlas.json"
+PADDING = 1  # Empty pixels between sprites
+MAX_WIDTH = 1024
+
+
+def pack(sizes):
+    # Shelf packing: tallest sprites first, fill rows left to right
+    positions = {}
+    x = y = 0
+    shelf_height = 0
+    width = 0
+    for name, (w, h) in sorted(sizes.items(), key=lambda item: (-item[1][1], -item[1][0])):
+        if x > 0 and x + w > MAX_WIDTH:
+            x = 0
+            y += shelf_height + PADDING
+            shelf_height = 0
+        positions[name] = (x, y)
+        x += w + PADDING
+        shelf_height = max(shelf_height, h)
+        width = max(width, x - PADDING)
+    return positions, width, y + shelf_height
+
+
+def build_atlas():
+    # convert_alpha needs a display mode, same pixel format as in the game
+    pygame.display.init()
+    pygame.display.set_mode((1, 1), pygame.HIDDEN)
+
+    sprites = {}
+    for name, (filename, size) in ATLAS_SPRITES.items():
+        sprite = pygame.image.load(os.path.join(SPRITES_DIR, filename)).convert_alpha()
+        if size:
+            sprite = pygame.transform.scale(sprite, size)
+        sprites[name] = sprite
+
+    positions, width, height = pack({name: sprite.get_size() for name, sprite in sprites.items()})
+
+    atlas = pygame.Surface((width, height), pygame.SRCALPHA)
+    atlas.fill((0, 0, 0, 0))
+    # The hash of every source lets the game notice a PNG that changed after the atlas was built
+    index = {"image": ATLAS_IMAGE, "sprites": {}, "sources": {}}
+    for name, sprite in sprites.items():
+        x, y = positions[name]
+        # MAX onto a transparent sheet copies the pixels instead of alpha blending them
+        atlas.blit(sprite, (x, y), special_flags=pygame.BLEND_RGBA_MAX)
+        index["sprites"][name] = [x, y, sprite.get_width(), sprite.get_height()]
+        filename = ATLAS_SPRITES[name][0]
+        index["sources"][name] = [filename, source_hash(os.path.join(SPRITES_DIR, filename))]
+
+    pygame.image.save(atlas, os.path.join(SPRITES_DIR, ATLAS_IMAGE))
+    with open(os.path.join(SPRITES_DIR, ATLAS_INDEX), "w") as f:
+        json.dump(index, f)
+
+    print(f"Packed {len(sprites)} sprites into {width}x{height} {ATLAS_IMAGE}")
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    build_atlas()
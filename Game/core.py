@@ -0,0 +1,592 @@
+import math
+import random
+
+import numpy as np
+import pygame
+
+from achievement_rules import AchievementEngine
+from placement import PlacementEngine
+from projectiles import ProjectileStore
+from spatial_hash import SpatialHash
+
+# Game rules without display, sound or assets: GameState holds one game,
+# step() advances it. pygame is only used for Rect, so no pygame.init() is needed.
+
+# ---- GAME VARIABLES ----
+WIDTH, HEIGHT = 1000, 800
+player_speed = 6
+slow_speed = 3
+item_size = 50
+obstacle_size = 50
+grid_cell_size = 64  # Spatial hash cell size for collision queries
+safe_margin = 40  # Free space between obstacles and items
+REFILL_STEPS = 12  # Steps between a level-up and the refill of its safe zone, the worker builds it meanwhile
+REFILL_ATTEMPTS = 2000  # The level is nearly full by then, off the game thread it can search much longer
+PLAYER_SIZE = (24, 51)  # Collision box, the sprite is drawn around it
+BOSS_SIZE = (171, 150)  # Collision box, the size of the boss sprite frames (81x71 scaled to 150 high)
+HEART_SIZE = 30
+max_boss_player_health = 3
+
+# ---- INPUTS ----
+# One bit per control, so a frame of input is a single small int
+INPUT_LEFT = 1
+INPUT_RIGHT = 2
+INPUT_UP = 4
+INPUT_DOWN = 8
+INPUT_SLOW = 16
+
+# ---- DIFFICULTY SETTINGS ----
+difficulty_settings = {
+    "easy": {"player_speed": 7, "obstacle_speed": 2, "spawn_rate": 0.5},
+    "normal": {"player_speed": 6, "obstacle_speed": 3, "spawn_rate": 1},
+    "hard": {"player_speed": 5, "obstacle_speed": 4, "spawn_rate": 1.5},
+    "insane": {"player_speed": 4, "obstacle_speed": 5, "spawn_rate": 2}
+}
+
+# ---- ACHIEVEMENTS ----
+# Rules: see achievement_rules.py. achievements.json can add more or override these.
+default_achievements = {
+    "first_blood": {"name": "First Blood", "desc": "Collect first coin", "unlocked": False,
+                    "rule": {"on": "coin_collected", "if": [["score", ">=", 1]]}},
+    "combo_master": {"name": "Combo Master", "desc": "Get 10x combo", "unlocked": False,
+                     "rule": {"on": "combo_changed", "if": [["combo", ">=", 10]]}},
+    "speed_demon": {"name": "Speed Demon", "desc": "Complete level in 30s", "unlocked": False,
+                    "rule": {"on": "level_completed", "if": [["duration", "<=", 30]]}},
+    "perfectionist": {"name": "Perfectionist", "desc": "Complete level without touching obstacles", "unlocked": False,
+                      "rule": {"on": "level_completed", "if": [["obstacles_touched", "==", False]]}},
+    "boss_slayer": {"name": "Boss Slayer", "desc": "Defeat a boss in endless mode", "unlocked": False,
+                    "rule": {"on": "boss_defeated", "if": [["mode", "==", "endless"]]}},
+    "combo_god": {"name": "Combo God", "desc": "Get 20x combo", "unlocked": False,
+                  "rule": {"on": "combo_changed", "if": [["combo", ">=", 20]]}},
+    "coin_collector": {"name": "Coin Collector", "desc": "Collect 100 coins total", "unlocked": False,
+                       "rule": {"on": "coin_collected", "if": [["total_coins", ">=", 100]]}},
+    "survivor": {"name": "Survivor", "desc": "Reach level 10 in endless mode", "unlocked": False,
+                 "rule": {"on": "level_completed", "if": [["next_level", ">=", 10], ["mode", "==", "endless"]]}},
+    "time_warrior": {"name": "Time Warrior", "desc": "Complete 5-minute time attack", "unlocked": False,
+                     "rule": {"on": "run_ended", "if": [["reason", "==", "time_over"], ["time_limit", "==", 300]]}},
+    "difficulty_master": {"name": "Difficulty Master", "desc": "Complete game on insane difficulty", "unlocked": False,
+                          "rule": {"on": "run_ended", "if": [["mode", "==", "endless"], ["difficulty", "==", "insane"],
+                                                             ["level", ">=", 10]]}}
+}
+
+
+# ------------------------------------------------------------
+#                        PLAYER BODY
+# ------------------------------------------------------------
+class PlayerBody:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.prev_x = x  # Positie voor de laatste update, om tussen te interpoleren
+        self.prev_y = y
+        self.dx = 0
+        self.dy = 0
+        self.facing_left = False
+        self.rect = pygame.Rect(x, y, *PLAYER_SIZE)
+
+    def update(self, inputs, speed, dt):
+        # speed is in pixels per 1/60 s
+        speed *= dt * 60
+        self.prev_x = self.x
+        self.prev_y = self.y
+        self.dx = 0
+        self.dy = 0
+
+        if inputs & INPUT_LEFT:
+            self.dx = -speed
+            self.facing_left = True
+
+        if inputs & INPUT_RIGHT:
+            self.dx = speed
+            self.facing_left = False
+
+        if inputs & INPUT_UP:
+            self.dy = -speed
+
+        if inputs & INPUT_DOWN:
+            self.dy = speed
+
+        # Positie updaten
+        self.x += self.dx
+        self.y += self.dy
+
+        # Borders controleren
+        self.x = max(0, min(WIDTH - self.rect.width, self.x))
+        self.y = max(0, min(HEIGHT - self.rect.height, self.y))
+
+        # Collision box volgen
+        self.rect.topleft = (self.x, self.y)
+
+    @property
+    def moving(self):
+        return self.dx != 0 or self.dy != 0
+
+
+# ------------------------------------------------------------
+#                           BOSS
+# ------------------------------------------------------------
+class Boss:
+    def __init__(self, state, size=BOSS_SIZE):
+        self.x = WIDTH // 2
+        self.y = HEIGHT // 2
+        self.width, self.height = size
+        self.hp = 100
+        self.max_hp = 100
+        self.attack_timer = 0
+        self.attack_interval = 2.0
+        self.attack_pattern = 0
+        self.rect = pygame.Rect(self.x - self.width//2, self.y - self.height//2,
+                                self.width, self.height)
+        self.projectiles = ProjectileStore(WIDTH, HEIGHT)
+        self.rotation = 0
+        self.last_coin_spawn = -math.inf
+        self.coin_spawn_interval = 2.0
+        self.hearts_spawned = False
+        self.last_hit_time = -math.inf
+        self.hurt_duration = 0.3
+        self.is_attacking = False
+        self.attack_animation_duration = 0.5
+        self.attack_animation_timer = 0
+        self.bob_offset = 0
+        self.bob_speed = 0.05
+        self.bob_amount = 3
+        self.state = "idle"  # idle, attack, hurt; the front end picks the animation from it
+
+    def update(self, state, dt):
+        # Update bobbing animation
+        self.bob_offset = math.sin(state.time * self.bob_speed * 10) * self.bob_amount
+
+        # Slow rotation
+        self.rotation += 0.1 * dt * 60
+
+        self.attack_timer += dt
+        self.attack_animation_timer = max(0, self.attack_animation_timer - dt)
+
+        if state.time - self.last_hit_time < self.hurt_duration:
+            self.state = "hurt"
+            self.is_attacking = False
+        elif self.attack_animation_timer > 0:
+            self.state = "attack"
+            self.is_attacking = True
+        else:
+            self.state = "idle"
+            self.is_attacking = False
+
+        # Check if it's time to attack
+        if self.attack_timer >= self.attack_interval:
+            self.attack_timer = 0
+            self.attack_pattern = (self.attack_pattern + 1) % 3
+            self.attack(state.player.rect)
+            self.attack_animation_timer = self.attack_animation_duration
+            self.state = "attack"
+
+        # Update collision rect position
+        self.rect.center = (int(self.x), int(self.y + self.bob_offset))
+
+        # Update projectiles (out of bounds ones are removed)
+        self.projectiles.update(dt)
+
+    def take_damage(self, state, amount):
+        self.hp -= amount
+        self.last_hit_time = state.time
+
+    def try_spawn_coin(self, state):
+        if state.time - self.last_coin_spawn >= self.coin_spawn_interval:
+            self.last_coin_spawn = state.time
+
+            # Spawn coins away from boss
+            for _ in range(20):
+                angle = state.rng.uniform(0, 2 * math.pi)
+                distance = state.rng.uniform(100, 300)
+                x = self.x + math.cos(angle) * distance
+                y = self.y + math.sin(angle) * distance
+
+                # Keep within screen
+                x = max(item_size, min(WIDTH - item_size, x))
+                y = max(item_size, min(HEIGHT - item_size, y))
+
+                new_coin = pygame.Rect(x, y, item_size, item_size)
+
+                # Don't spawn inside boss
+                if (not new_coin.colliderect(self.rect) and
+                    not state.item_grid.collides(new_coin)):
+                    state.items.append(new_coin)
+                    state.item_grid.insert(new_coin)
+                    break
+
+    def spawn_hearts(self, state):
+        state.hearts = []
+        for _ in range(2):
+            for _ in range(50):  # Try multiple positions
+                angle = state.rng.uniform(0, 2 * math.pi)
+                distance = state.rng.uniform(150, 400)
+                x = self.x + math.cos(angle) * distance
+                y = self.y + math.sin(angle) * distance
+
+                x = max(15, min(WIDTH - 15, x))
+                y = max(15, min(HEIGHT - 15, y))
+
+                heart_rect = pygame.Rect(x - 15, y - 15, HEART_SIZE, HEART_SIZE)
+
+                if not heart_rect.colliderect(self.rect):
+                    state.hearts.append({
+                        'rect': heart_rect,
+                        'x': x,
+                        'y': y,
+                        'collected': False
+                    })
+                    break
+        state.heart_grid.rebuild(state.hearts, lambda heart: heart['rect'])
+
+    def attack(self, player_rect):
+        if self.attack_pattern == 0:  # Circle
+            angles = np.arange(8) / 8 * 2 * math.pi
+            self.projectiles.spawn(self.x, self.y, np.cos(angles), np.sin(angles))
+        elif self.attack_pattern == 1:  # Targeted
+            dx = player_rect.centerx - self.x
+            dy = player_rect.centery - self.y
+            dist = math.sqrt(dx*dx + dy*dy)
+            if dist > 0:
+                dx /= dist
+                dy /= dist
+            self.projectiles.spawn(self.x, self.y, dx, dy)
+        else:  # Spiral
+            angles = self.rotation * 0.0174533 + np.arange(4) * math.pi / 2
+            self.projectiles.spawn(self.x, self.y, np.cos(angles), np.sin(angles))
+
+
+# ------------------------------------------------------------
+#                        GAME STATE
+# ------------------------------------------------------------
+# Everything one game needs. events collects what happened during the last
+# step() as tuples, e.g. ("coin", x, y), for the front end to play sounds and effects.
+# Right after __init__ it holds what happened while the first level was built.
+# The core never prints, thousands of headless games would flood stdout.
+class GameState:
+    def __init__(self, mode="endless", time_limit=600, difficulty="normal", seed=None,
+                 achievements=None, total_coins_collected=0, boss_size=BOSS_SIZE, pregen=None):
+        self.mode = mode  # "time_attack" or "endless"
+        self.time_limit = time_limit
+        self.difficulty = difficulty
+        self.player_speed = difficulty_settings[difficulty]["player_speed"]
+        self.seed = random.randrange(2**32) if seed is None else seed
+        self.rng = random.Random(self.seed)
+        self.placement = PlacementEngine(WIDTH, HEIGHT, rng=self.rng)
+        self.pregen = pregen  # LevelPregenerator, or None to build every level in step()
+        self.next_level_request = None
+        self.pending_refill = None  # [steps left, future or None, refill_layout args], see fit_layout()
+        self.achievements = achievements if achievements is not None else \
+            {key: dict(value) for key, value in default_achievements.items()}
+        self.achievement_engine = AchievementEngine(self.achievements)
+        self.total_coins_collected = total_coins_collected
+        self.boss_size = boss_size
+
+        self.time = 0.0  # Simulated seconds since the start of the game
+        self.events = []
+        self.over = None  # None, "game_over" or "time_over"
+        self.invulnerable = False  # Hits and obstacles never end the game, for benchmarks
+
+        self.player = PlayerBody(WIDTH // 2, HEIGHT // 2)
+        self.items, self.obstacles = [], []
+        self.item_grid = SpatialHash(grid_cell_size)
+        self.obstacle_grid = SpatialHash(grid_cell_size)
+        self.score = 0
+        self.combo = 0
+        self.max_combo = 0
+        self.combo_time = 1
+        self.coins_collected = 0  # This game, total_coins_collected counts all games
+        self.last_collect_time = 0
+        self.level = 1
+        self.level_start_time = 0
+        self.obstacles_touched = False  # For perfectionist achievement
+        self.boss = None
+        self.health = max_boss_player_health  # Player health during boss battles
+        self.max_health = max_boss_player_health
+        self.hearts = []
+        self.heart_grid = SpatialHash(grid_cell_size)
+
+        set_level(self, *generate_level(self, 20, 15, self.player.rect))
+        queue_next_level(self)
+
+
+# ------------------------------------------------------------
+#                    LEVEL GENERATION
+# ------------------------------------------------------------
+def generate_level(state, num_items, num_obstacles, player_rect, safe_radius=100):
+    # check dat het niet te dicht bij speler staat
+    safe_zone = SpatialHash(grid_cell_size)
+    safe_zone.insert(player_rect.inflate(safe_radius*2, safe_radius*2))
+
+    # items
+    items = state.placement.place(num_items, item_size, avoid=[(safe_zone, 0)])
+    placed_items = SpatialHash(grid_cell_size)
+    placed_items.rebuild(items)
+
+    # obstacles (marge om het obstakel = marge om elk item)
+    obstacles = state.placement.place(num_obstacles, obstacle_size,
+                                      avoid=[(safe_zone, 0), (placed_items, safe_margin)])
+
+    if len(items) < num_items or len(obstacles) < num_obstacles:
+        state.events.append(("level_full", len(items), num_items, len(obstacles), num_obstacles))
+    return items, obstacles
+
+def set_level(state, items, obstacles):
+    # Swap in a new layout and register it in the collision grids
+    state.items, state.obstacles = items, obstacles
+    state.item_grid.rebuild(items)
+    state.obstacle_grid.rebuild(obstacles)
+
+def generate_layout(num_items, num_obstacles, seed):
+    # Layout without a player, runs on the pregeneration thread with its own random generator
+    engine = PlacementEngine(WIDTH, HEIGHT, rng=random.Random(seed))
+    items = engine.place(num_items, item_size)
+    placed_items = SpatialHash(grid_cell_size)
+    placed_items.rebuild(items)
+    obstacles = engine.place(num_obstacles, obstacle_size, avoid=[(placed_items, safe_margin)])
+    return items, obstacles
+
+def fit_layout(state, layout, player_rect, safe_radius):
+    # Take out what lies in the safe zone around where the player really is. Finding new spots
+    # for it can take a while in a full level, so that is done by refill_layout() on the worker
+    # thread and added REFILL_STEPS steps later (apply_refill). The player can't get out of the
+    # safe zone in that time, and the result doesn't depend on when the worker finishes.
+    items, obstacles = layout
+    safe_rect = player_rect.inflate(safe_radius*2, safe_radius*2)
+    kept_items = [item for item in items if not item.colliderect(safe_rect)]
+    kept_obstacles = [obs for obs in obstacles if not obs.colliderect(safe_rect)]
+    missing_items = len(items) - len(kept_items)
+    missing_obstacles = len(obstacles) - len(kept_obstacles)
+    if missing_items or missing_obstacles:
+        # Copies, the game changes its own lists while the worker reads these
+        args = ([item.copy() for item in kept_items], [obs.copy() for obs in kept_obstacles], safe_rect,
+                missing_items, missing_obstacles, state.rng.getrandbits(32))
+        future = state.pregen.submit(refill_layout, *args) if state.pregen else None
+        state.pending_refill = [REFILL_STEPS, future, args]
+    return kept_items, kept_obstacles
+
+def refill_layout(items, obstacles, safe_rect, num_items, num_obstacles, seed):
+    # New spots outside the safe zone that keep the same distances as generate_level.
+    # Runs on the pregeneration thread with its own random generator. Returns (items, obstacles).
+    engine = PlacementEngine(WIDTH, HEIGHT, rng=random.Random(seed))
+    safe_zone = SpatialHash(grid_cell_size)
+    safe_zone.insert(safe_rect)
+    placed_items = SpatialHash(grid_cell_size)
+    placed_items.rebuild(items)
+    placed_obstacles = SpatialHash(grid_cell_size)
+    placed_obstacles.rebuild(obstacles)
+    new_items = engine.place(num_items, item_size, attempts=REFILL_ATTEMPTS,
+                             avoid=[(safe_zone, 0), (placed_items, 0), (placed_obstacles, safe_margin)])
+    for item in new_items:
+        placed_items.insert(item)
+    new_obstacles = engine.place(num_obstacles, obstacle_size, attempts=REFILL_ATTEMPTS,
+                                 avoid=[(safe_zone, 0), (placed_obstacles, 0), (placed_items, safe_margin)])
+    return new_items, new_obstacles
+
+def apply_refill(state):
+    # Counts down a pending refill, adds it to the level when it is due
+    refill = state.pending_refill
+    refill[0] -= 1
+    if refill[0] > 0:
+        return
+    state.pending_refill = None
+    _, future, args = refill
+    layout = None
+    if future is not None:
+        try:
+            layout = future.result()  # Only waits when the worker is behind
+        except Exception as e:
+            state.events.append(("error", f"Level refill failed: {e}"))
+    if layout is None:
+        layout = refill_layout(*args)
+    new_items, new_obstacles = layout
+    if len(new_items) < args[3] or len(new_obstacles) < args[4]:
+        state.events.append(("level_full", len(new_items), args[3], len(new_obstacles), args[4]))
+    set_level(state, state.items + new_items, state.obstacles + new_obstacles)
+
+def queue_next_level(state):
+    # Pick the layout for the next level: level + 1, or this level again once the boss is beaten.
+    # Its parameters come from state.rng now, so the result does not depend on when it is built.
+    next_level = state.level if state.boss else state.level + 1
+    if state.mode == "endless" and next_level % 5 == 0 and not state.boss:
+        state.next_level_request = None
+        return  # Boss level, no layout needed
+    new_obstacles = 15 + state.rng.randint(0, 5) + next_level
+    state.next_level_request = (next_level, (20, new_obstacles, state.rng.getrandbits(32)))
+    if state.pregen:
+        state.pregen.request(next_level, 20, new_obstacles, state.next_level_request[1][2])
+
+def next_level_layout(state):
+    state.pending_refill = None  # Meant for the level that is being replaced
+    request = state.next_level_request
+    state.next_level_request = None
+    layout = None
+    if request and request[0] == state.level:
+        if state.pregen:
+            layout = state.pregen.take(state.level)
+        if layout is None:
+            layout = generate_layout(*request[1])
+    if layout is None:
+        new_obstacles = 15 + state.rng.randint(0, 5) + state.level
+        return generate_level(state, 20, new_obstacles, state.player.rect, safe_radius=150)
+    return fit_layout(state, layout, state.player.rect, safe_radius=150)
+
+
+# ------------------------------------------------------------
+#                      ACHIEVEMENTS
+# ------------------------------------------------------------
+def achievement_event(state, event, **fields):
+    # Feed a game event to the achievement rules, see achievement_rules.py
+    for key in state.achievement_engine.emit(event, fields):
+        state.events.append(("achievement", key))
+
+def end_run(state, reason):
+    state.over = reason
+    achievement_event(state, "run_ended", reason=reason, score=state.score, level=state.level, mode=state.mode,
+                      difficulty=state.difficulty, time_limit=state.time_limit)
+
+
+# ------------------------------------------------------------
+#                           STEP
+# ------------------------------------------------------------
+def step(state, inputs, dt, profiler=None):
+    # Advance the game by dt seconds. inputs is a mask of INPUT_* bits.
+    # profiler: optional profiler.FrameProfiler, gets a lap after every phase.
+    state.events = []
+    if state.over:
+        return
+    state.time += dt
+    player = state.player
+
+    # Player update
+    speed = slow_speed if inputs & INPUT_SLOW else state.player_speed
+    player.update(inputs, speed, dt)
+    if profiler:
+        profiler.lap("player")
+
+    # Update boss if active
+    boss = state.boss
+    if boss:
+        boss.update(state, dt)
+
+        # Spawn coins periodically during boss battle
+        boss.try_spawn_coin(state)
+
+        # Spawn hearts at the start of boss battle if not already spawned
+        if not boss.hearts_spawned:
+            boss.spawn_hearts(state)
+            boss.hearts_spawned = True
+
+        # Check boss projectiles collision
+        hits = boss.projectiles.hit_rect(player.rect)  # Hit projectiles are removed
+        if hits:
+            # Decrease player health during boss battle
+            state.health -= hits
+            state.events.append(("hit", player.rect.centerx, player.rect.centery))
+
+            # Check if player is dead
+            if state.health <= 0 and not state.invulnerable:
+                state.events.append(("death",))
+                end_run(state, "game_over")
+        if profiler:
+            profiler.lap("boss")
+
+    # Coin collisions
+    for c in state.item_grid.query(player.rect):
+        state.items.remove(c)
+        state.item_grid.remove(c)
+        state.events.append(("coin", c.x, c.y))
+
+        if state.time - state.last_collect_time <= state.combo_time:
+            state.combo += 1
+        else:
+            state.combo = 1
+
+        state.last_collect_time = state.time
+        state.score += 1 * state.combo
+        state.max_combo = max(state.max_combo, state.combo)
+
+        # Update total coins
+        state.coins_collected += 1
+        state.total_coins_collected += 1
+        achievement_event(state, "combo_changed", combo=state.combo)
+        achievement_event(state, "coin_collected", score=state.score, combo=state.combo,
+                          total_coins=state.total_coins_collected, level=state.level)
+
+        # If boss is active, damage boss when collecting coins
+        if boss:
+            boss.take_damage(state, 5 * state.combo)  # Each coin damages boss
+
+    # Check heart collection during boss battle
+    if boss:
+        for heart in state.heart_grid.query(player.rect):
+            if not heart['collected']:
+                heart['collected'] = True
+                state.heart_grid.remove(heart)
+                state.health = min(state.max_health, state.health + 1)
+                state.events.append(("heart", heart['rect'].centerx, heart['rect'].centery))
+
+    if state.combo and state.time - state.last_collect_time > state.combo_time:
+        state.combo = 0
+        achievement_event(state, "combo_changed", combo=0)
+
+    # Check obstacle collision (only if boss is not active)
+    hit_obstacle = not boss and state.obstacle_grid.collides(player.rect) and not state.invulnerable
+    if profiler:
+        profiler.lap("collisions")
+    if hit_obstacle:
+        state.obstacles_touched = True
+        state.events.append(("obstacle", player.rect.centerx, player.rect.centery))
+        state.events.append(("death",))
+        end_run(state, "game_over")
+        return
+
+    # Time check (only for time attack)
+    if state.mode == "time_attack" and state.time >= state.time_limit:
+        end_run(state, "time_over")
+        return
+
+    # Safe zone refill of the last new level
+    if state.pending_refill:
+        apply_refill(state)
+
+    # Level up
+    if not state.items and not boss:
+        achievement_event(state, "level_completed", level=state.level, next_level=state.level + 1,
+                          duration=state.time - state.level_start_time,
+                          obstacles_touched=state.obstacles_touched, mode=state.mode)
+        state.level += 1
+        state.level_start_time = state.time
+        state.obstacles_touched = False
+
+        # Check for boss level (every 5 levels in endless mode)
+        if state.mode == "endless" and state.level % 5 == 0:
+            boss = state.boss = Boss(state, state.boss_size)
+            # Reset player health for boss battle
+            state.health = state.max_health
+            # Clear all obstacles and existing coins during boss battle
+            state.pending_refill = None
+            set_level(state, [], [])
+            # Clear hearts
+            state.hearts.clear()
+            state.heart_grid.clear()
+            state.events.append(("boss",))
+            achievement_event(state, "boss_spawned", level=state.level, mode=state.mode)
+        else:
+            set_level(state, *next_level_layout(state))
+            state.events.append(("level", state.level))
+        queue_next_level(state)
+
+    # Check if boss is defeated
+    if boss and boss.hp <= 0:
+        state.events.append(("boss_defeated", boss.x, boss.y))
+        achievement_event(state, "boss_defeated", level=state.level, mode=state.mode)
+        state.boss = None
+        state.hearts.clear()  # Clear any remaining hearts
+        state.heart_grid.clear()
+        # Generate next level after boss
+        set_level(state, *next_level_layout(state))
+        queue_next_level(state)
+        # Add bonus score for defeating boss
+        state.score += 100 * state.combo
+    if profiler:
+        profiler.lap("level")
@@ -1,23 +1,44 @@
+import time
+STARTUP_START = time.perf_counter()  # Before the imports, pygame and numpy take most of the startup
+
 import pygame
 import random
 import sys
-import time
-import json
 import os
 import math
 
+from assets import AssetManager
+from core import (BOSS_SIZE, HEIGHT, INPUT_DOWN, INPUT_LEFT, INPUT_RIGHT, INPUT_SLOW, INPUT_UP, WIDTH,
+                  GameState, default_achievements, difficulty_settings, generate_layout, item_size,
+                  obstacle_size, step)
+from particles import ParticleEngine
+from placement import LevelPregenerator
+from profiler import FrameProfiler, ProfilerOverlay
+from storage import AchievementStore, AsyncFileWriter, HighscoreStore, RunHistory
+from timing import FRAME_DT, GameClock
+from tracing import Tracer
+from replay import Replay, state_checksum
+from rendering import (CircleSpriteCache, DirtyRectRenderer, RotationCache, ScreenCache,
+                       SpriteAtlas, SpriteVariantCache, SurfacePool, TextCache)
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 
 # ---- INIT ----
+startup_import_time = time.perf_counter() - STARTUP_START
 pygame.init()
 pygame.mixer.init()
-WIDTH, HEIGHT = 1000, 800
 WIN = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("Treasure Hunter")
 CLOCK = pygame.time.Clock()
-FONT = pygame.font.SysFont("comicsans", 30)
-FONT_SMALL = pygame.font.SysFont("comicsans", 20)
+tracer = Tracer()  # Frame traces, see tracing.py
+assets = AssetManager(tracer)  # Sprites, sounds and fonts, loaded on first use
+assets.register("font", lambda: pygame.font.SysFont("comicsans", 30))
+assets.register("font_small", lambda: pygame.font.SysFont("comicsans", 20))
+FONT = assets["font"]  # Every screen has text, the fonts are needed right away
+FONT_SMALL = assets["font_small"]
+text_cache = TextCache()  # Rendered text surfaces, shared by all screens
+file_writer = AsyncFileWriter(tracer=tracer)  # Saves files off the main thread
 
 # ---- COLORS ----
 WHITE = (255, 255, 255)
@@ -32,134 +53,128 @@ PURPLE = (180, 0, 255)
 DARK_RED = (150, 0, 0)
 
 # ---- GAME VARIABLES ----
-player_speed = 6
-slow_speed = 3
-item_size = 50
-obstacle_size = 50
 highscore_file = os.path.join(BASE_DIR, "highscore.json")
 achievements_file = os.path.join(BASE_DIR, "achievements.json")
-highscore = 0
+highscores = HighscoreStore(highscore_file, file_writer)  # Read once, saved in the background
+run_history = RunHistory(os.path.join(BASE_DIR, "runs.db"))  # Every finished run, for the leaderboards
+highscore_difficulty = "normal"  # Leaderboard shown on the highscores screen
 achievement_scroll_offset = 0
+DIRTY_RECT_RENDERING = True  # Only push changed screen areas while playing
+BOSS_ROTATION_STEP = 2  # Degrees between cached rotated boss frames
+BOSS_ROTATION_CACHE_MB = 32
+SIM_RATE = 120  # Simulation steps per second, independent of the frame rate
+SIM_DT = 1 / SIM_RATE
+MAX_FRAME_TIME = 0.25  # A longer frame is simulated as 0.25 s, so a hitch can't snowball
+RENDER_FPS = 60  # 0 = uncapped
+game_clock = GameClock(MAX_FRAME_TIME)  # Sampled once per frame, the front end reads the time from it
+PROFILER_KEY = pygame.K_F3  # Toggles the frame timing overlay
+TRACE_KEY = pygame.K_F4  # Starts/stops writing a frame trace, also: python main.py --trace
+TRACE_DIR = os.path.join(BASE_DIR, "traces")
 
 # ---- VISUAL EFFECTS ----
 screen_shake = 0
 screen_flash = 0
 flash_color = (255, 255, 255)
-particles = []
-
-# ---- BOSS HEALTH SYSTEM ----
-boss_player_health = 3
-max_boss_player_health = 3
-boss_hearts = []
 
 # ---- LOAD SPRITES ----
-background_img = pygame.image.load(
-    os.path.join(BASE_DIR, "sprites", "sand_sprite.jpg")
-).convert()
-background_img = pygame.transform.scale(background_img, (WIDTH, HEIGHT))
-
-cactus_img = pygame.image.load(
-    os.path.join(BASE_DIR, "sprites", "cactus_sprite.png")
-).convert_alpha()
-cactus_img = pygame.transform.scale(cactus_img, (obstacle_size, obstacle_size))
-
-coin_img = pygame.image.load(
-    os.path.join(BASE_DIR, "sprites", "coin_sprite.png")
-).convert_alpha()
-coin_img = pygame.transform.scale(coin_img, (item_size, item_size))
-
-player_sheet = pygame.image.load(
-    os.path.join(BASE_DIR, "sprites", "player_walk.png")
-).convert_alpha()
-
-player_shadow = pygame.image.load(
-    os.path.join(BASE_DIR, "sprites", "player_shadow.png")
-).convert_alpha()
-
-# ---- Load heart sprite (create a simple one if not available) ----
-heart_path = os.path.join(BASE_DIR, "sprites", "heart_sprite.png")
-try:
-    heart_img = pygame.image.load(heart_path).convert_alpha()
-    heart_img = pygame.transform.scale(heart_img, (30, 30))
-except:
-    heart_img = pygame.Surface((30, 30), pygame.SRCALPHA)
-    pygame.draw.polygon(heart_img, RED, [
+sprite_variants = SpriteVariantCache()  # Flipped/tinted versions of sprites, made once
+surface_pool = SurfacePool()  # Scratch surfaces for per-frame effects
+circle_sprites = CircleSpriteCache()  # Pre-rasterized particle circles
+
+# Sprites packed by build_atlas.py, already scaled to their in-game size
+assets.register("sprite_atlas", lambda: SpriteAtlas(os.path.join(BASE_DIR, "sprites", "atlas.json")))
+
+def load_sprite(name, filename, size=None):
+    # Atlas first, the single file if the atlas is missing or out of date
+    sprite = assets["sprite_atlas"].get(name, size)
+    if sprite is None:
+        sprite = pygame.image.load(os.path.join(BASE_DIR, "sprites", filename)).convert_alpha()
+        if size:
+            sprite = pygame.transform.scale(sprite, size)
+    return sprite
+
+def register_sprite(name, filename, size=None, fallback=None):
+    # The same file at the same size is loaded once, whatever name asks for it
+    assets.register(name, lambda: load_sprite(name, filename, size), key=(filename, size), fallback=fallback)
+
+def load_background():
+    # Background is opaque and screen sized, it stays a separate jpg
+    background = pygame.image.load(os.path.join(BASE_DIR, "sprites", "sand_sprite.jpg")).convert()
+    return pygame.transform.scale(background, (WIDTH, HEIGHT))
+
+assets.register("background", load_background)
+register_sprite("cactus", "cactus_sprite.png", (obstacle_size, obstacle_size))
+register_sprite("coin", "coin_sprite.png", (item_size, item_size))
+register_sprite("player_walk", "player_walk.png")
+register_sprite("player_shadow", "player_shadow.png")
+
+# ---- Heart sprite (a simple one if not available) ----
+def draw_heart():
+    heart = pygame.Surface((30, 30), pygame.SRCALPHA)
+    pygame.draw.polygon(heart, RED, [
         (15, 5), (20, 10), (25, 5), (20, 15),
         (15, 25), (10, 15), (5, 5), (10, 10)
     ])
+    return heart
+
+register_sprite("heart", "heart_sprite.png", (30, 30), fallback=draw_heart)
+assets.register("empty_heart", lambda: sprite_variants.multiplied(assets["heart"], (100, 100, 100, 255)))
+
+# ---- Boss projectile sprite ----
+PROJECTILE_RADIUS = 10
+
+def draw_projectile():
+    projectile = pygame.Surface((PROJECTILE_RADIUS * 2, PROJECTILE_RADIUS * 2), pygame.SRCALPHA)
+    pygame.draw.circle(projectile, (255, 200, 200), (PROJECTILE_RADIUS, PROJECTILE_RADIUS), PROJECTILE_RADIUS)
+    pygame.draw.circle(projectile, RED, (PROJECTILE_RADIUS, PROJECTILE_RADIUS), 6)
+    return projectile
+
+assets.register("projectile", draw_projectile)
+
+# ---- Boss sprite sheet ----
+def load_boss_sheet():
+    sheet = load_sprite("boss", "boss_sprite.png")
+    print(f"Successfully loaded boss sprite sheet: {sheet.get_width()}x{sheet.get_height()}")
+    return sheet
+
+assets.register("boss_sheet", load_boss_sheet, fallback=lambda: None)  # None: placeholder animation
 
 # ---- LOAD SOUNDS ----
-coin_sound = pygame.mixer.Sound(
-    os.path.join(BASE_DIR, "sounds", "coin.mp3")
-)
+def load_sound(filename, optional=False):
+    path = os.path.join(BASE_DIR, "sounds", filename)
+    if optional and not os.path.exists(path):
+        return None
+    return pygame.mixer.Sound(path)
 
-death_path = os.path.join(BASE_DIR, "sounds", "death.mp3")
-death_sound = pygame.mixer.Sound(death_path) if os.path.exists(death_path) else None
+assets.register("coin_sound", lambda: load_sound("coin.mp3"))
+assets.register("death_sound", lambda: load_sound("death.mp3", optional=True))
 
-bg_music = os.path.join(BASE_DIR, "sounds", "background_song.mp3")
+# Everything a game needs, loaded when it starts instead of in the middle of it
+GAME_ASSETS = ("background", "cactus", "coin", "player_walk", "player_shadow", "heart", "empty_heart",
+               "projectile", "coin_sound", "death_sound")
 
 # ---- BACKGROUND MUSIC ----
+# Streamed from disk by the mixer, only the first part is read here
+bg_music = os.path.join(BASE_DIR, "sounds", "background_song.mp3")
 pygame.mixer.music.load(bg_music)
 pygame.mixer.music.set_volume(0.5)
 pygame.mixer.music.play(-1)
 
-# ---- BOSS SPRITE LOADING ----
-boss_sprite_path = os.path.join(BASE_DIR, "sprites", "boss_sprite.png")
-try:
-    boss_idle_sheet = pygame.image.load(boss_sprite_path).convert_alpha()
-    print(f"Successfully loaded boss sprite sheet: {boss_idle_sheet.get_width()}x{boss_idle_sheet.get_height()}")
-except Exception as e:
-    boss_idle_sheet = None
-    print(f"Could not load boss sprite sheet: {e}. Using placeholder animation.")
-
 
 # ---- SCREENS ----
 MENU, TIME_SELECT, PLAYING, PAUSED, GAME_OVER, TIME_OVER, NEW_HIGHSCORE, CONTROLS, HIGHSCORES, DIFFICULTY_SELECT, ACHIEVEMENTS, TUTORIAL = (
     "menu", "time_select", "playing", "paused", "game_over", "time_over", "new_highscore", "controls", "highscores", "difficulty_select", "achievements", "tutorial"
 )
 screen = MENU
-
-# ---- BACKGROUND MUSIC ----
-pygame.mixer.music.load(bg_music)
-pygame.mixer.music.set_volume(0.5)  
-pygame.mixer.music.play(-1)
+screen_cache = ScreenCache()  # Static screens are rendered once and only presented when changed
 
 # ---- DIFFICULTY SETTINGS ----
-difficulty_settings = {
-    "easy": {"player_speed": 7, "obstacle_speed": 2, "spawn_rate": 0.5},
-    "normal": {"player_speed": 6, "obstacle_speed": 3, "spawn_rate": 1},
-    "hard": {"player_speed": 5, "obstacle_speed": 4, "spawn_rate": 1.5},
-    "insane": {"player_speed": 4, "obstacle_speed": 5, "spawn_rate": 2}
-}
 current_difficulty = "normal"
 
 # ---- ACHIEVEMENTS ----
-default_achievements = {
-    "first_blood": {"name": "First Blood", "desc": "Collect first coin", "unlocked": False},
-    "combo_master": {"name": "Combo Master", "desc": "Get 10x combo", "unlocked": False},
-    "speed_demon": {"name": "Speed Demon", "desc": "Complete level in 30s", "unlocked": False},
-    "perfectionist": {"name": "Perfectionist", "desc": "Complete level without touching obstacles", "unlocked": False},
-    "boss_slayer": {"name": "Boss Slayer", "desc": "Defeat a boss in endless mode", "unlocked": False},
-    "combo_god": {"name": "Combo God", "desc": "Get 20x combo", "unlocked": False},
-    "coin_collector": {"name": "Coin Collector", "desc": "Collect 100 coins total", "unlocked": False},
-    "survivor": {"name": "Survivor", "desc": "Reach level 10 in endless mode", "unlocked": False},
-    "time_warrior": {"name": "Time Warrior", "desc": "Complete 5-minute time attack", "unlocked": False},
-    "difficulty_master": {"name": "Difficulty Master", "desc": "Complete game on insane difficulty", "unlocked": False}
-}
-
-# Load achievements from file
-if os.path.exists(achievements_file):
-    with open(achievements_file, "r") as f:
-        achievements = json.load(f)
-    # Ensure all default achievements exist
-    for key, value in default_achievements.items():
-        if key not in achievements:
-            achievements[key] = value
-else:
-    achievements = default_achievements.copy()
-
-# Track achievement progress
-total_coins_collected = 0
+# Loaded once, also tracks achievement progress (total_coins_collected) across sessions
+achievement_store = AchievementStore(achievements_file, file_writer, default_achievements)
+achievements = achievement_store.achievements
 
 # ---- BOSS ANIMATION SYSTEM ----
 class BossAnimation:
@@ -167,17 +182,21 @@ class BossAnimation:
         self.state = "idle"  # idle, attack, hurt, defeated
         self.frame_index = 0
         self.animation_speed = 0.15  # Controls animation speed
-        self.last_update = time.time()
+        self.last_update = -math.inf  # Game time of the last frame change
         self.idle_frames = []
         self.attack_frames = []
         self.hurt_frames = []
         self.defeated_frames = []
         
+        # Rotated frames, shared by all animation states
+        self.rotation_cache = RotationCache(BOSS_ROTATION_STEP, BOSS_ROTATION_CACHE_MB * 1024 * 1024)
+        
         # Load animation frames
         self.load_frames()
     
     def load_frames(self):
         # Load idle frames from sprite sheet (4 frames, 71x81 each, side by side)
+        boss_idle_sheet = assets["boss_sheet"]
         if boss_idle_sheet:
             try:
                 sheet_width = boss_idle_sheet.get_width()
@@ -224,25 +243,13 @@ class BossAnimation:
         # Create attack and hurt frames by tinting idle frames
         for frame in self.idle_frames:
             # Attack frames (red tint)
-            attack_frame = frame.copy()
-            red_overlay = pygame.Surface((frame.get_width(), frame.get_height()), pygame.SRCALPHA)
-            red_overlay.fill((255, 50, 50, 80))
-            attack_frame.blit(red_overlay, (0, 0))
-            self.attack_frames.append(attack_frame)
+            self.attack_frames.append(sprite_variants.tinted(frame, (255, 50, 50, 80)))
             
             # Hurt frames (blue tint)
-            hurt_frame = frame.copy()
-            blue_overlay = pygame.Surface((frame.get_width(), frame.get_height()), pygame.SRCALPHA)
-            blue_overlay.fill((100, 100, 255, 80))
-            hurt_frame.blit(blue_overlay, (0, 0))
-            self.hurt_frames.append(hurt_frame)
+            self.hurt_frames.append(sprite_variants.tinted(frame, (100, 100, 255, 80)))
             
             # Defeated frames (dark tint)
-            defeated_frame = frame.copy()
-            dark_overlay = pygame.Surface((frame.get_width(), frame.get_height()), pygame.SRCALPHA)
-            dark_overlay.fill((0, 0, 0, 150))
-            defeated_frame.blit(dark_overlay, (0, 0))
-            self.defeated_frames.append(defeated_frame)
+            self.defeated_frames.append(sprite_variants.tinted(frame, (0, 0, 0, 150)))
     
     def create_placeholder_frames(self):
         # Simple placeholder frames scaled to match 81x71 -> 162x150
@@ -266,8 +273,9 @@ class BossAnimation:
         self.hurt_frames = [frame.copy() for frame in self.idle_frames]
         self.defeated_frames = [frame.copy() for frame in self.idle_frames]
     
-    def update(self, state):
-        current_time = time.time()
+    def update(self, state, now):
+        # now: game time in seconds
+        current_time = now
         
         # Change state if needed
         if state != self.state:
@@ -282,6 +290,11 @@ class BossAnimation:
             if frames:
                 self.frame_index = (self.frame_index + 1) % len(frames)
     
+    def reset(self):
+        self.state = "idle"
+        self.frame_index = 0
+        self.last_update = -math.inf
+    
     def get_current_frames(self):
         if self.state == "idle":
             return self.idle_frames
@@ -298,227 +311,85 @@ class BossAnimation:
         if frames and self.frame_index < len(frames):
             return frames[self.frame_index]
         return self.idle_frames[0] if self.idle_frames else None
-
-# Update Boss class for variable sprite sizes
-class Boss:
+    
+    def get_rotated_frame(self, angle):
+        frame = self.get_current_frame()
+        if frame is None:
+            return None
+        return self.rotation_cache.get(frame, angle)
+
+# Draws a core.Boss, the animation follows the state the boss is in
+class BossView:
     def __init__(self):
-        self.x = WIDTH // 2
-        self.y = HEIGHT // 2
         self.animation = BossAnimation()
+
+    def update(self, boss, now):
+        self.animation.update(boss.state, now)
+
+    def draw(self, win, boss, now, alpha=1.0):
+        # Returns the rects that were drawn on, for dirty rect rendering
+        rects = []
         
-        # Get size from first animation frame
-        first_frame = self.animation.get_current_frame()
-        if first_frame:
-            self.width = first_frame.get_width()
-            self.height = first_frame.get_height()
-        else:
-            self.width = 162  # Default if no frames
-            self.height = 150
-            
-        self.hp = 100
-        self.max_hp = 100
-        self.attack_timer = 0
-        self.attack_interval = 2.0
-        self.attack_pattern = 0
-        self.rect = pygame.Rect(self.x - self.width//2, self.y - self.height//2, 
-                               self.width, self.height)
-        self.projectiles = []
-        self.rotation = 0
-        self.last_coin_spawn = 0
-        self.coin_spawn_interval = 2.0
-        self.hearts_spawned = False
-        self.last_hit_time = 0
-        self.hurt_duration = 0.3
-        self.is_attacking = False
-        self.attack_animation_duration = 0.5
-        self.attack_animation_timer = 0
-        self.bob_offset = 0
-        self.bob_speed = 0.05
-        self.bob_amount = 3
-        print(f"Boss created with size {self.width}x{self.height}")
-        
-    def update(self, dt, player_rect):
-        # Update bobbing animation
-        self.bob_offset = math.sin(time.time() * self.bob_speed * 10) * self.bob_amount
-        
-        # Slow rotation
-        self.rotation += 0.1
-        
-        self.attack_timer += dt
-        self.attack_animation_timer = max(0, self.attack_animation_timer - dt)
-        
-        # Update boss state
-        current_time = time.time()
-        
-        if current_time - self.last_hit_time < self.hurt_duration:
-            state = "hurt"
-            self.is_attacking = False
-        elif self.attack_animation_timer > 0:
-            state = "attack"
-            self.is_attacking = True
-        else:
-            state = "idle"
-            self.is_attacking = False
-        
-        # Check if it's time to attack
-        if self.attack_timer >= self.attack_interval:
-            self.attack_timer = 0
-            self.attack_pattern = (self.attack_pattern + 1) % 3
-            self.attack(player_rect)
-            self.attack_animation_timer = self.attack_animation_duration
-            state = "attack"
-        
-        # Update animation
-        self.animation.update(state)
-        
-        # Update collision rect position
-        self.rect.center = (int(self.x), int(self.y + self.bob_offset))
-            
-        # Update projectiles
-        for proj in self.projectiles[:]:
-            proj[0] += proj[2] * 5 * dt * 60
-            proj[1] += proj[3] * 5 * dt * 60
-            
-            # Remove if out of bounds
-            if (proj[0] < -50 or proj[0] > WIDTH + 50 or 
-                proj[1] < -50 or proj[1] > HEIGHT + 50):
-                if proj in self.projectiles:
-                    self.projectiles.remove(proj)
-    
-    def take_damage(self, amount):
-        self.hp -= amount
-        self.last_hit_time = time.time()
-                    
-    def try_spawn_coin(self, items, player_rect):
-        current_time = time.time()
-        if current_time - self.last_coin_spawn >= self.coin_spawn_interval:
-            self.last_coin_spawn = current_time
-            
-            # Spawn coins away from boss
-            for _ in range(20):
-                angle = random.uniform(0, 2 * math.pi)
-                distance = random.uniform(100, 300)
-                x = self.x + math.cos(angle) * distance
-                y = self.y + math.sin(angle) * distance
-                
-                # Keep within screen
-                x = max(item_size, min(WIDTH - item_size, x))
-                y = max(item_size, min(HEIGHT - item_size, y))
-                
-                new_coin = pygame.Rect(x, y, item_size, item_size)
-                
-                # Don't spawn inside boss
-                if (not new_coin.colliderect(self.rect) and 
-                    not any(new_coin.colliderect(coin) for coin in items)):
-                    items.append(new_coin)
-                    break
-    
-    def spawn_hearts(self):
-        global boss_hearts
-        boss_hearts = []
-        for _ in range(2):
-            for _ in range(50):  # Try multiple positions
-                angle = random.uniform(0, 2 * math.pi)
-                distance = random.uniform(150, 400)
-                x = self.x + math.cos(angle) * distance
-                y = self.y + math.sin(angle) * distance
-                
-                x = max(15, min(WIDTH - 15, x))
-                y = max(15, min(HEIGHT - 15, y))
-                
-                heart_rect = pygame.Rect(x - 15, y - 15, 30, 30)
-                
-                if not heart_rect.colliderect(self.rect):
-                    boss_hearts.append({
-                        'rect': heart_rect,
-                        'x': x,
-                        'y': y,
-                        'collected': False
-                    })
-                    break
-                    
-    def attack(self, player_rect):
-        if self.attack_pattern == 0:  # Circle
-            for i in range(8):
-                angle = (i / 8) * 2 * math.pi
-                dx = math.cos(angle)
-                dy = math.sin(angle)
-                self.projectiles.append([self.x, self.y, dx, dy])
-        elif self.attack_pattern == 1:  # Targeted
-            dx = player_rect.centerx - self.x
-            dy = player_rect.centery - self.y
-            dist = math.sqrt(dx*dx + dy*dy)
-            if dist > 0:
-                dx /= dist
-                dy /= dist
-            self.projectiles.append([self.x, self.y, dx, dy])
-        else:  # Spiral
-            for i in range(4):
-                angle = self.rotation * 0.0174533 + (i * math.pi / 2)
-                dx = math.cos(angle)
-                dy = math.sin(angle)
-                self.projectiles.append([self.x, self.y, dx, dy])
-                
-    def draw(self, win):
         # Get current animation frame
         frame = self.animation.get_current_frame()
         
         if frame:
             # Calculate position with bobbing
-            draw_x = self.x - frame.get_width() // 2
-            draw_y = self.y - frame.get_height() // 2 + self.bob_offset
+            draw_x = boss.x - frame.get_width() // 2
+            draw_y = boss.y - frame.get_height() // 2 + boss.bob_offset
             
             # Apply slight rotation only during attack
             if self.animation.state == "attack":
                 # More dramatic rotation during attack
-                attack_rotation = self.rotation * 2
-                rotated_frame = pygame.transform.rotate(frame, attack_rotation)
-                rot_rect = rotated_frame.get_rect(center=(self.x, self.y + self.bob_offset))
-                win.blit(rotated_frame, rot_rect)
+                attack_rotation = boss.rotation * 2
+                rotated_frame = self.animation.get_rotated_frame(attack_rotation)
+                rot_rect = rotated_frame.get_rect(center=(boss.x, boss.y + boss.bob_offset))
+                rects.append(win.blit(rotated_frame, rot_rect))
             else:
                 # Gentle rotation for idle/hurt states
-                rotated_frame = pygame.transform.rotate(frame, self.rotation * 0.5)
-                rot_rect = rotated_frame.get_rect(center=(self.x, self.y + self.bob_offset))
-                win.blit(rotated_frame, rot_rect)
+                rotated_frame = self.animation.get_rotated_frame(boss.rotation * 0.5)
+                rot_rect = rotated_frame.get_rect(center=(boss.x, boss.y + boss.bob_offset))
+                rects.append(win.blit(rotated_frame, rot_rect))
             
             # Visual effects based on state
             if self.animation.state == "attack":
                 # Add attack glow effect
                 glow_size = max(frame.get_width(), frame.get_height()) + 20
-                glow = pygame.Surface((glow_size, glow_size), pygame.SRCALPHA)
-                # Pulsing glow
-                pulse = abs(math.sin(time.time() * 8)) * 30 + 70
-                pygame.draw.circle(glow, (255, 100, 0, int(pulse)), 
-                                 (glow_size // 2, glow_size // 2), 
-                                 glow_size // 2)
-                win.blit(glow, (self.x - glow_size // 2, 
-                              self.y - glow_size // 2 + self.bob_offset))
+                with surface_pool.scratch((glow_size, glow_size), pygame.SRCALPHA) as glow:
+                    glow.fill((0, 0, 0, 0))
+                    # Pulsing glow
+                    pulse = abs(math.sin(now * 8)) * 30 + 70
+                    pygame.draw.circle(glow, (255, 100, 0, int(pulse)), 
+                                     (glow_size // 2, glow_size // 2), 
+                                     glow_size // 2)
+                    rects.append(win.blit(glow, (boss.x - glow_size // 2, 
+                                               boss.y - glow_size // 2 + boss.bob_offset)))
             
             elif self.animation.state == "hurt":
                 # Hurt flash effect
-                current_time = time.time()
-                time_since_hit = current_time - self.last_hit_time
-                if time_since_hit < self.hurt_duration:
-                    flash_alpha = int(150 * (1 - time_since_hit / self.hurt_duration))
-                    flash = pygame.Surface((frame.get_width(), frame.get_height()), pygame.SRCALPHA)
-                    pygame.draw.circle(flash, (255, 255, 255, flash_alpha), 
-                                     (frame.get_width() // 2, frame.get_height() // 2), 
-                                     min(frame.get_width(), frame.get_height()) // 2)
-                    win.blit(flash, (draw_x, draw_y))
+                time_since_hit = now - boss.last_hit_time
+                if time_since_hit < boss.hurt_duration:
+                    flash_alpha = int(150 * (1 - time_since_hit / boss.hurt_duration))
+                    with surface_pool.scratch(frame.get_size(), pygame.SRCALPHA) as flash:
+                        flash.fill((0, 0, 0, 0))
+                        pygame.draw.circle(flash, (255, 255, 255, flash_alpha), 
+                                         (frame.get_width() // 2, frame.get_height() // 2), 
+                                         min(frame.get_width(), frame.get_height()) // 2)
+                        rects.append(win.blit(flash, (draw_x, draw_y)))
         
         # Draw health bar
         bar_width = 180
         bar_height = 15
-        bar_x = self.x - bar_width // 2
-        bar_y = self.y - self.height//2 - 30 + self.bob_offset  # Position above boss
+        bar_x = boss.x - bar_width // 2
+        bar_y = boss.y - boss.height//2 - 30 + boss.bob_offset  # Position above boss
         
         # Background
-        pygame.draw.rect(win, (100, 0, 0), (bar_x, bar_y, bar_width, bar_height), border_radius=3)
+        rects.append(pygame.draw.rect(win, (100, 0, 0), (bar_x, bar_y, bar_width, bar_height), border_radius=3))
         # Health
-        health_width = (self.hp / self.max_hp) * bar_width
-        if self.hp > 50:
+        health_width = (boss.hp / boss.max_hp) * bar_width
+        if boss.hp > 50:
             health_color = (0, 255, 0)
-        elif self.hp > 20:
+        elif boss.hp > 20:
             health_color = (255, 255, 0)
         else:
             health_color = (255, 0, 0)
@@ -527,70 +398,60 @@ class Boss:
         pygame.draw.rect(win, WHITE, (bar_x, bar_y, bar_width, bar_height), 2, border_radius=3)
         
         # Pulsing effect when low health
-        if self.hp < 30:
-            pulse = abs(math.sin(time.time() * 5)) * 50 + 50
-            pulse_surface = pygame.Surface((bar_width, bar_height), pygame.SRCALPHA)
-            pygame.draw.rect(pulse_surface, (255, 255, 255, int(pulse)), 
-                           (0, 0, bar_width, bar_height), 3, border_radius=3)
-            win.blit(pulse_surface, (bar_x, bar_y))
+        if boss.hp < 30:
+            pulse = abs(math.sin(now * 5)) * 50 + 50
+            with surface_pool.scratch((bar_width, bar_height), pygame.SRCALPHA) as pulse_surface:
+                pulse_surface.fill((0, 0, 0, 0))
+                pygame.draw.rect(pulse_surface, (255, 255, 255, int(pulse)), 
+                               (0, 0, bar_width, bar_height), 3, border_radius=3)
+                win.blit(pulse_surface, (bar_x, bar_y))
+        
+        # Draw projectiles in one batch
+        if len(boss.projectiles):
+            positions = boss.projectiles.positions(alpha) - PROJECTILE_RADIUS
+            projectile_rects = win.blits([(assets["projectile"], pos) for pos in positions.tolist()])
+            # Many rects are slower to merge than one big one
+            if len(projectile_rects) <= 32:
+                rects.extend(projectile_rects)
+            else:
+                rects.append(projectile_rects[0].unionall(projectile_rects))
         
-        # Draw projectiles
-        for proj in self.projectiles:
-            pygame.draw.circle(win, (255, 200, 200), (int(proj[0]), int(proj[1])), 10)
-            pygame.draw.circle(win, RED, (int(proj[0]), int(proj[1])), 6)
+        return rects
 
 # ---- PARTICLE SYSTEM ----
-class Particle:
-    def __init__(self, x, y, color, velocity, size, lifetime):
-        self.x = x
-        self.y = y
-        self.color = color
-        self.vx, self.vy = velocity
-        self.size = size
-        self.lifetime = lifetime
-        self.max_lifetime = lifetime
-        
-    def update(self):
-        self.x += self.vx
-        self.y += self.vy
-        self.lifetime -= 1
-        self.vy += 0.1  # Gravity
-        
-    def draw(self, win):
-        alpha = int(255 * (self.lifetime / self.max_lifetime))
-        color = list(self.color)
-        color.append(alpha)
-        pygame.draw.circle(win, self.color[:3], (int(self.x), int(self.y)), 
-                          int(self.size * (self.lifetime / self.max_lifetime)))
+particle_engine = ParticleEngine()
 
 def create_particles(x, y, color, count=10):
-    for _ in range(count):
-        angle = random.uniform(0, 2 * math.pi)
-        speed = random.uniform(1, 5)
-        vx = math.cos(angle) * speed
-        vy = math.sin(angle) * speed
-        size = random.uniform(2, 8)
-        lifetime = random.randint(20, 40)
-        particles.append(Particle(x, y, color, (vx, vy), size, lifetime))
+    particle_engine.emit(x, y, count, color=color, speed=(1, 5), size=(2, 8), lifetime=(20, 40))
 
 def create_coin_particles(x, y):
-    for _ in range(15):
-        angle = random.uniform(0, 2 * math.pi)
-        speed = random.uniform(2, 8)
-        vx = math.cos(angle) * speed
-        vy = math.sin(angle) * speed
-        size = random.uniform(3, 6)
-        lifetime = random.randint(30, 50)
-        color = (random.randint(200, 255), random.randint(150, 200), 0)
-        particles.append(Particle(x + 25, y + 25, color, (vx, vy), size, lifetime))
+    particle_engine.emit(x + 25, y + 25, 15, color_range=((200, 255), (150, 200), (0, 0)),
+                         speed=(2, 8), size=(3, 6), lifetime=(30, 50))
+
+def draw_particles(alpha=1.0):
+    # Returns the rect around all particles (one dirty rect for the whole layer)
+    color_ids, radii, xs, ys = particle_engine.visible(alpha)
+    if len(radii) == 0:
+        return None
+    
+    # One table lookup for all sprites, building the blit list is the only per-particle Python work
+    sprites = circle_sprites.lookup(particle_engine.palette, color_ids, radii)
+    lefts = xs - radii
+    tops = ys - radii
+    # Streamed into blits() instead of built as a list: zip reuses its tuples, so the frame doesn't
+    # leave 20k short-lived objects behind that set off full garbage collections
+    WIN.blits(zip(sprites.tolist(), zip(lefts.tolist(), tops.tolist())), False)
+    
+    left = int(lefts.min())
+    top = int(tops.min())
+    bounds = pygame.Rect(left, top, int((xs + radii).max()) - left, int((ys + radii).max()) - top)
+    return bounds.clip(WIN.get_rect())
 
 # ------------------------------------------------------------
 #                        PLAYER CLASS
 # ------------------------------------------------------------
 class Player:
-    def __init__(self, x, y, sprite_sheet, shadow_sprite, scale=3):
-        self.x = x
-        self.y = y
+    def __init__(self, sprite_sheet, shadow_sprite, scale=3):
         self.scale = scale
 
         # Frames uit sheet snijden
@@ -605,6 +466,11 @@ class Player:
             )
             self.frames.append(frame)
 
+        # Animatie sets: naam -> (rechts, links)
+        self.animations = {}
+        self.add_animation("walk", self.frames)
+        self.animation = "walk"
+
         # Shadow opschalen (maar minder dan speler)
         self.shadow = pygame.transform.scale(
             shadow_sprite, (shadow_sprite.get_width() * scale, shadow_sprite.get_height() * scale)
@@ -614,247 +480,206 @@ class Player:
         self.anim_index = 0
         self.anim_speed = 0.2
 
-        self.dx = 0
-        self.dy = 0
-        self.facing_left = False
-
-        self.rect = pygame.Rect(self.x, self.y, 8 * scale, 17 * scale)
-
-    def update(self, keys, speed):
-        self.dx = 0
-        self.dy = 0
-
-        if keys[pygame.K_LEFT] or keys[pygame.K_a]:
-            self.dx = -speed
-            self.facing_left = True
-
-        if keys[pygame.K_RIGHT] or keys[pygame.K_d]:
-            self.dx = speed
-            self.facing_left = False
-
-        if keys[pygame.K_UP] or keys[pygame.K_w]:
-            self.dy = -speed
-
-        if keys[pygame.K_DOWN] or keys[pygame.K_s]:
-            self.dy = speed
-
-        # Positie updaten
-        self.x += self.dx
-        self.y += self.dy
-
-        # Borders controleren
-        self.x = max(0, min(WIDTH - self.rect.width, self.x))
-        self.y = max(0, min(HEIGHT - self.rect.height, self.y))
-
-        # Collision box volgen
-        self.rect.topleft = (self.x, self.y)
+    def add_animation(self, name, frames):
+        # Facing-left frames are mirrored once here instead of every draw
+        self.animations[name] = (frames, [sprite_variants.flipped(frame) for frame in frames])
 
+    def update(self, body, dt):
         # Animatie alleen bewegen
-        if self.dx != 0 or self.dy != 0:
-            self.anim_index += self.anim_speed
+        if body.moving:
+            self.anim_index += self.anim_speed * dt * 60
             if self.anim_index >= len(self.frames):
                 self.anim_index = 0
         else:
             self.anim_index = 0
 
-    def draw(self, win):
+    def draw(self, win, body, alpha=1.0):
+        # Tussen vorige en huidige positie van de core.PlayerBody tekenen
+        rect = body.rect.copy()
+        rect.topleft = (body.prev_x + (body.x - body.prev_x) * alpha,
+                        body.prev_y + (body.y - body.prev_y) * alpha)
+
         # Apply screen shake
-        shake_x = random.randint(-screen_shake, screen_shake) if screen_shake > 0 else 0
-        shake_y = random.randint(-screen_shake, screen_shake) if screen_shake > 0 else 0
+        shake = int(screen_shake)
+        shake_x = random.randint(-shake, shake) if shake > 0 else 0
+        shake_y = random.randint(-shake, shake) if shake > 0 else 0
         
         # Schaduw eerst tekenen
-        shadow_x = self.rect.centerx - self.shadow.get_width() // 2 + shake_x
-        shadow_y = self.rect.bottom - self.shadow.get_height() // 2 - 20 + shake_y
-        win.blit(self.shadow, (shadow_x, shadow_y))
-
-        # Huidige frame
-        frame = self.frames[int(self.anim_index)]
+        shadow_x = rect.centerx - self.shadow.get_width() // 2 + shake_x
+        shadow_y = rect.bottom - self.shadow.get_height() // 2 - 20 + shake_y
+        shadow_rect = win.blit(self.shadow, (shadow_x, shadow_y))
 
-        # Flip als nodig
-        if self.facing_left:
-            frame = pygame.transform.flip(frame, True, False)
+        # Huidige frame, gespiegeld als nodig
+        right_frames, left_frames = self.animations[self.animation]
+        frames = left_frames if body.facing_left else right_frames
+        frame = frames[int(self.anim_index)]
 
         # Speler tekenen — gecentreerd iets boven de schaduw
-        draw_x = self.rect.centerx - frame.get_width() // 2 + shake_x
-        draw_y = self.rect.centery - frame.get_height() // 2 + 8 + shake_y
+        draw_x = rect.centerx - frame.get_width() // 2 + shake_x
+        draw_y = rect.centery - frame.get_height() // 2 + 8 + shake_y
 
-        win.blit(frame, (draw_x, draw_y))
+        frame_rect = win.blit(frame, (draw_x, draw_y))
+        return shadow_rect.union(frame_rect)
 
 # ---- PLAYER INSTANCE ----
-player = Player(WIDTH//2, HEIGHT//2, player_sheet, player_shadow)
+player = None  # Made when the first game starts, with the sprites
 
 # ------------------------------------------------------------
-#                    LEVEL GENERATION
+#                        GAME STATE
 # ------------------------------------------------------------
-def generate_level(num_items, num_obstacles, player_rect, safe_radius=100):
-    obstacles = []
-    items = []
-
-    # items
-    while len(items) < num_items:
-        x = random.randint(0, WIDTH - item_size)
-        y = random.randint(0, HEIGHT - item_size)
-        new_item = pygame.Rect(x, y, item_size, item_size)
-
-        # check dat het niet te dicht bij speler staat
-        safe_zone = player_rect.inflate(safe_radius*2, safe_radius*2)
-        if not new_item.colliderect(safe_zone) and not any(new_item.colliderect(i) for i in items):
-            items.append(new_item)
-
-    # obstacles
-    safe_margin = 40
-    max_attempts = 1000  # Prevent infinite loops
-    attempts = 0
-    
-    while len(obstacles) < num_obstacles and attempts < max_attempts:
-        attempts += 1
-        x = random.randint(0, WIDTH - obstacle_size)
-        y = random.randint(0, HEIGHT - obstacle_size)
-        new_obs = pygame.Rect(x, y, obstacle_size, obstacle_size)
-
-        safe = True
-        # check afstand tot speler
-        safe_zone = player_rect.inflate(safe_radius*2, safe_radius*2)
-        if new_obs.colliderect(safe_zone):
-            safe = False
-
-        # check afstand tot items
-        if safe:
-            for item in items:
-                item_safe = item.inflate(safe_margin * 2, safe_margin * 2)
-                if new_obs.colliderect(item_safe):
-                    safe = False
-                    break
-
-        # check afstand tot andere obstakels
-        if safe and not any(new_obs.colliderect(o) for o in obstacles):
-            obstacles.append(new_obs)
-
-    return items, obstacles
-
-items, obstacles = [], []
-score = 0
-combo = 0
-combo_time = 1
-last_collect_time = 0
-start_time = 0
+game = None  # core.GameState of the current game
+boss_view = None  # Made for the first boss and kept, its frames and rotation cache are reused
+level_pregen = LevelPregenerator(generate_layout)  # Builds the next level while the current one is played
 time_limit = 600
-level = 1
-pause_offset = 0  # Track time spent paused
 game_mode = "time_attack"  # "time_attack" or "endless"
-boss = None
-level_start_time = 0
-obstacles_touched = False  # For perfectionist achievement
 game_initialized = False  # Track if game has been initialized
 
+# ---- REPLAYS ----
+# Every game is recorded, python main.py --replay <file> plays one back
+REPLAY_DIR = os.path.join(BASE_DIR, "replays")
+MAX_REPLAYS = 20  # Oldest recordings are removed
+# Names of the saved replays, oldest first. Listed once here so ending a game never touches the directory.
+saved_replays = sorted(name for name in os.listdir(REPLAY_DIR) if name.endswith(".replay")) if os.path.isdir(REPLAY_DIR) else []
+recording = None  # Replay of the current game
+playback = None  # Replay being played back
+playback_inputs = None
+game_is_scripted = False  # Replays and benchmark runs don't count for highscores or progress
+benchmark_run = None  # Scripted benchmark scenario, see benchmark.py
+
+def save_recording():
+    # Write the current game's replay, called once when the game ends
+    global recording
+    if recording is None or recording.ticks == 0:
+        recording = None
+        return
+    recording.finish(game)
+    name = time.strftime("%Y%m%d-%H%M%S") + f"-{recording.seed}.replay"
+    path = os.path.join(REPLAY_DIR, name)
+    # Encoded, written and pruned on the writer thread, the recording is not touched again
+    file_writer.write(path, recording.to_bytes)
+    print(f"Saving replay: {path}")
+    recording = None
+    if name not in saved_replays:
+        saved_replays.append(name)
+    while len(saved_replays) > MAX_REPLAYS:
+        file_writer.remove(os.path.join(REPLAY_DIR, saved_replays.pop(0)))
+
+def finish_playback():
+    print("Replay finished: " + ("final state matches the recording" if state_checksum(game) == playback.checksum
+                                 else "DESYNC, final state does not match the recording"))
+    stop_playback()
+
+def stop_playback():
+    # Also used when a replay is left early, the next game from the menu is a normal one again
+    global playback, playback_inputs
+    playback = playback_inputs = None
+
+def next_inputs(keys):
+    # Input for one simulation tick: from the replay when playing one back, otherwise the keyboard.
+    # None when the replay has run out.
+    if benchmark_run is not None:
+        return benchmark_run.inputs()
+    if playback is None:
+        return read_inputs(keys)
+    inputs = next(playback_inputs, None)
+    if inputs is None:
+        finish_playback()
+    return inputs
+
+def get_boss_view():
+    global boss_view
+    if boss_view is None:
+        boss_view = BossView()
+    return boss_view
+
+def read_inputs(keys):
+    # Keyboard state -> core INPUT_* bits
+    inputs = 0
+    if keys[pygame.K_LEFT] or keys[pygame.K_a]:
+        inputs |= INPUT_LEFT
+    if keys[pygame.K_RIGHT] or keys[pygame.K_d]:
+        inputs |= INPUT_RIGHT
+    if keys[pygame.K_UP] or keys[pygame.K_w]:
+        inputs |= INPUT_UP
+    if keys[pygame.K_DOWN] or keys[pygame.K_s]:
+        inputs |= INPUT_DOWN
+    if keys[pygame.K_LCTRL] or keys[pygame.K_RCTRL] or keys[pygame.K_SPACE]:
+        inputs |= INPUT_SLOW
+    return inputs
+
+# ---- RUN HISTORY ----
+def record_run(reason):
+    # One row in the run history per played game, reason: "game_over", "time_over" or "quit"
+    if game is None or game_is_scripted:
+        return
+    run_history.record(mode=game.mode, time_limit=game.time_limit, difficulty=game.difficulty, score=game.score,
+                       level=game.level, max_combo=game.max_combo, coins=game.coins_collected, duration=game.time,
+                       seed=game.seed, reason=reason)
+
 # ---- ACHIEVEMENT FUNCTIONS ----
-def unlock_achievement(key):
-    if key in achievements and not achievements[key]["unlocked"]:
-        achievements[key]["unlocked"] = True
-        # Save to file
-        with open(achievements_file, "w") as f:
-            json.dump(achievements, f)
-        return True
-    return False
-
-def check_achievements():
-    global total_coins_collected
-    
-    # First blood
-    if score >= 1 and not achievements["first_blood"]["unlocked"]:
-        if unlock_achievement("first_blood"):
-            print(f"Achievement unlocked: {achievements['first_blood']['name']}")
-    
-    # Combo master
-    if combo >= 10 and not achievements["combo_master"]["unlocked"]:
-        if unlock_achievement("combo_master"):
-            print(f"Achievement unlocked: {achievements['combo_master']['name']}")
-    
-    # Combo god
-    if combo >= 20 and not achievements["combo_god"]["unlocked"]:
-        if unlock_achievement("combo_god"):
-            print(f"Achievement unlocked: {achievements['combo_god']['name']}")
-    
-    # Speed demon (complete level in 30 seconds)
-    if level > 1:
-        level_time = time.time() - level_start_time - pause_offset
-        if level_time <= 30 and not achievements["speed_demon"]["unlocked"]:
-            if unlock_achievement("speed_demon"):
-                print(f"Achievement unlocked: {achievements['speed_demon']['name']}")
-    
-    # Perfectionist
-    if not obstacles_touched and len(items) == 0 and not achievements["perfectionist"]["unlocked"]:
-        if unlock_achievement("perfectionist"):
-            print(f"Achievement unlocked: {achievements['perfectionist']['name']}")
-    
-    # Coin collector
-    if total_coins_collected >= 100 and not achievements["coin_collector"]["unlocked"]:
-        if unlock_achievement("coin_collector"):
-            print(f"Achievement unlocked: {achievements['coin_collector']['name']}")
-    
-    # Survivor
-    if level >= 10 and not achievements["survivor"]["unlocked"]:
-        if unlock_achievement("survivor"):
-            print(f"Achievement unlocked: {achievements['survivor']['name']}")
-    
-    # Time warrior
-    if game_mode == "time_attack" and time_limit == 300 and score > 0 and not achievements["time_warrior"]["unlocked"]:
-        if unlock_achievement("time_warrior"):
-            print(f"Achievement unlocked: {achievements['time_warrior']['name']}")
+def save_achievements():
+    # Queued for the background writer, saves close together become one write
+    achievement_store.save()
 
 # ------------------------------------------------------------
 #                        SCREENS
 # ------------------------------------------------------------
-def draw_menu():
-    WIN.fill(BLUE)
-    title = FONT.render("Treasure Hunter", True, WHITE)
-    start = FONT.render("Press SPACE to Start", True, WHITE)
-    controls = FONT.render("Press C for Controls", True, WHITE)
-    highscores = FONT.render("Press S for Highscores", True, WHITE)
-    achievements_btn = FONT.render("Press A for Achievements", True, WHITE)
-    difficulty_btn = FONT.render("Press D for Difficulty", True, WHITE)
+def render_menu(win):
+    win.fill(BLUE)
+    title = text_cache.render(FONT, "Treasure Hunter", True, WHITE)
+    start = text_cache.render(FONT, "Press SPACE to Start", True, WHITE)
+    controls = text_cache.render(FONT, "Press C for Controls", True, WHITE)
+    highscores = text_cache.render(FONT, "Press S for Highscores", True, WHITE)
+    achievements_btn = text_cache.render(FONT, "Press A for Achievements", True, WHITE)
+    difficulty_btn = text_cache.render(FONT, "Press D for Difficulty", True, WHITE)
     
-    WIN.blit(title, (WIDTH//2 - title.get_width()//2, HEIGHT//6))
-    WIN.blit(start, (WIDTH//2 - start.get_width()//2, HEIGHT//3))
-    WIN.blit(controls, (WIDTH//2 - controls.get_width()//2, HEIGHT//2.5))
-    WIN.blit(highscores, (WIDTH//2 - highscores.get_width()//2, HEIGHT//2.1))
-    WIN.blit(achievements_btn, (WIDTH//2 - achievements_btn.get_width()//2, HEIGHT//1.8))
-    WIN.blit(difficulty_btn, (WIDTH//2 - difficulty_btn.get_width()//2, HEIGHT//1.6))
-    pygame.display.update()
+    win.blit(title, (WIDTH//2 - title.get_width()//2, HEIGHT//6))
+    win.blit(start, (WIDTH//2 - start.get_width()//2, HEIGHT//3))
+    win.blit(controls, (WIDTH//2 - controls.get_width()//2, HEIGHT//2.5))
+    win.blit(highscores, (WIDTH//2 - highscores.get_width()//2, HEIGHT//2.1))
+    win.blit(achievements_btn, (WIDTH//2 - achievements_btn.get_width()//2, HEIGHT//1.8))
+    win.blit(difficulty_btn, (WIDTH//2 - difficulty_btn.get_width()//2, HEIGHT//1.6))
+
+def draw_menu():
+    screen_cache.present(WIN, MENU, (), render_menu)
+
+def render_pause_menu(win):
+    win.fill(BLUE)
+    title = text_cache.render(FONT, "Game Paused", True, WHITE)
+    start = text_cache.render(FONT, "Press ESC to Continue", True, WHITE)
+    stop = text_cache.render(FONT, "Press Q to Return to Menu", True, WHITE)
+    win.blit(title, (WIDTH//2 - title.get_width()//2, HEIGHT//3))
+    win.blit(start, (WIDTH//2 - start.get_width()//2, HEIGHT//2))
+    win.blit(stop, (WIDTH//2 - stop.get_width()//2, HEIGHT//1.5))
 
 def draw_pause_menu():
-    WIN.fill(BLUE)
-    title = FONT.render("Game Paused", True, WHITE)
-    start = FONT.render("Press ESC to Continue", True, WHITE)
-    stop = FONT.render("Press Q to Return to Menu", True, WHITE)
-    WIN.blit(title, (WIDTH//2 - title.get_width()//2, HEIGHT//3))
-    WIN.blit(start, (WIDTH//2 - start.get_width()//2, HEIGHT//2))
-    WIN.blit(stop, (WIDTH//2 - stop.get_width()//2, HEIGHT//1.5))
-    pygame.display.update()
+    screen_cache.present(WIN, PAUSED, (), render_pause_menu)
 
-def draw_time_select():
-    WIN.fill(GREEN)
+def render_time_select(win):
+    win.fill(GREEN)
     
     # Tutorial button at the top
-    tutorial = FONT_SMALL.render("Press T for Tutorial", True, BLACK)
-    WIN.blit(tutorial, (WIDTH//2 - tutorial.get_width()//2, HEIGHT//8))
-    title = FONT.render("Choose Game Mode", True, BLACK)
-    option1 = FONT.render("1. 1 Minute Time Attack", True, BLACK)
-    option2 = FONT.render("2. 2 Minutes Time Attack", True, BLACK)
-    option3 = FONT.render("3. 5 Minutes Time Attack", True, BLACK)
-    option4 = FONT.render("4. Endless Mode", True, BLACK)
-    back = FONT.render("Press BACKSPACE to Return", True, BLACK)
-    WIN.blit(title, (WIDTH//2 - title.get_width()//2, HEIGHT//4.5))
-    WIN.blit(option1, (WIDTH//2 - option1.get_width()//2, HEIGHT//3))
-    WIN.blit(option2, (WIDTH//2 - option2.get_width()//2, HEIGHT//2.3))
-    WIN.blit(option3, (WIDTH//2 - option3.get_width()//2, HEIGHT//1.9))
-    WIN.blit(option4, (WIDTH//2 - option4.get_width()//2, HEIGHT//1.6))
-    WIN.blit(back, (WIDTH//2 - back.get_width()//2, HEIGHT//1.25))
-    pygame.display.update()
+    tutorial = text_cache.render(FONT_SMALL, "Press T for Tutorial", True, BLACK)
+    win.blit(tutorial, (WIDTH//2 - tutorial.get_width()//2, HEIGHT//8))
+    title = text_cache.render(FONT, "Choose Game Mode", True, BLACK)
+    option1 = text_cache.render(FONT, "1. 1 Minute Time Attack", True, BLACK)
+    option2 = text_cache.render(FONT, "2. 2 Minutes Time Attack", True, BLACK)
+    option3 = text_cache.render(FONT, "3. 5 Minutes Time Attack", True, BLACK)
+    option4 = text_cache.render(FONT, "4. Endless Mode", True, BLACK)
+    back = text_cache.render(FONT, "Press BACKSPACE to Return", True, BLACK)
+    win.blit(title, (WIDTH//2 - title.get_width()//2, HEIGHT//4.5))
+    win.blit(option1, (WIDTH//2 - option1.get_width()//2, HEIGHT//3))
+    win.blit(option2, (WIDTH//2 - option2.get_width()//2, HEIGHT//2.3))
+    win.blit(option3, (WIDTH//2 - option3.get_width()//2, HEIGHT//1.9))
+    win.blit(option4, (WIDTH//2 - option4.get_width()//2, HEIGHT//1.6))
+    win.blit(back, (WIDTH//2 - back.get_width()//2, HEIGHT//1.25))
 
-def draw_difficulty_select():
-    WIN.fill(PURPLE)
-    title = FONT.render("Select Difficulty", True, WHITE)
+def draw_time_select():
+    screen_cache.present(WIN, TIME_SELECT, (), render_time_select)
+
+def render_difficulty_select(win):
+    win.fill(PURPLE)
+    title = text_cache.render(FONT, "Select Difficulty", True, WHITE)
     
     difficulties = ["easy", "normal", "hard", "insane"]
     colors = [GREEN, BLUE, ORANGE, RED]
@@ -863,34 +688,36 @@ def draw_difficulty_select():
     for i, diff in enumerate(difficulties):
         color = colors[i]
         if diff == current_difficulty:
-            text = FONT.render(f"{i+1}. {diff.upper()} (CURRENT)", True, color)
+            text = text_cache.render(FONT, f"{i+1}. {diff.upper()} (CURRENT)", True, color)
         else:
-            text = FONT.render(f"{i+1}. {diff.title()}", True, color)
+            text = text_cache.render(FONT, f"{i+1}. {diff.title()}", True, color)
         
         # Show difficulty stats
         stats = difficulty_settings[diff]
-        stats_text = FONT_SMALL.render(
+        stats_text = text_cache.render(FONT_SMALL, 
             f"Speed: {stats['player_speed']} | Obstacle Speed: {stats['obstacle_speed']} | Spawn: {stats['spawn_rate']}x", 
             True, WHITE
         )
         
-        WIN.blit(text, (WIDTH//2 - text.get_width()//2, y_offset))
-        WIN.blit(stats_text, (WIDTH//2 - stats_text.get_width()//2, y_offset + 30))
+        win.blit(text, (WIDTH//2 - text.get_width()//2, y_offset))
+        win.blit(stats_text, (WIDTH//2 - stats_text.get_width()//2, y_offset + 30))
         y_offset += 80
     
-    back = FONT.render("Press BACKSPACE to Return", True, WHITE)
-    WIN.blit(back, (WIDTH//2 - back.get_width()//2, HEIGHT//1.15))
-    pygame.display.update()
+    back = text_cache.render(FONT, "Press BACKSPACE to Return", True, WHITE)
+    win.blit(back, (WIDTH//2 - back.get_width()//2, HEIGHT//1.15))
 
-def draw_achievements():
-    WIN.fill((50, 50, 100))
-    title = FONT.render("Achievements", True, WHITE)
-    WIN.blit(title, (WIDTH//2 - title.get_width()//2, HEIGHT//10))
+def draw_difficulty_select():
+    screen_cache.present(WIN, DIFFICULTY_SELECT, (current_difficulty,), render_difficulty_select)
+
+def render_achievements(win):
+    win.fill((50, 50, 100))
+    title = text_cache.render(FONT, "Achievements", True, WHITE)
+    win.blit(title, (WIDTH//2 - title.get_width()//2, HEIGHT//10))
     
     unlocked_count = sum(1 for a in achievements.values() if a["unlocked"])
     total_count = len(achievements)
-    progress = FONT.render(f"Unlocked: {unlocked_count}/{total_count}", True, WHITE)
-    WIN.blit(progress, (WIDTH//2 - progress.get_width()//2, HEIGHT//7))
+    progress = text_cache.render(FONT, f"Unlocked: {unlocked_count}/{total_count}", True, WHITE)
+    win.blit(progress, (WIDTH//2 - progress.get_width()//2, HEIGHT//7))
     
     y_offset = HEIGHT//4
     achievements_list = list(achievements.items())
@@ -904,8 +731,8 @@ def draw_achievements():
             break
             
         color = GREEN if ach["unlocked"] else GRAY
-        name_text = FONT_SMALL.render(ach["name"], True, color)
-        desc_text = FONT_SMALL.render(ach["desc"], True, WHITE)
+        name_text = text_cache.render(FONT_SMALL, ach["name"], True, color)
+        desc_text = text_cache.render(FONT_SMALL, ach["desc"], True, WHITE)
         
         # Draw achievement box
         box_width = WIDTH - 100
@@ -915,23 +742,23 @@ def draw_achievements():
         
         # Box background
         box_color = (30, 30, 60) if ach["unlocked"] else (20, 20, 40)
-        pygame.draw.rect(WIN, box_color, (box_x, box_y, box_width, box_height), border_radius=10)
-        pygame.draw.rect(WIN, color, (box_x, box_y, box_width, box_height), 2, border_radius=10)
+        pygame.draw.rect(win, box_color, (box_x, box_y, box_width, box_height), border_radius=10)
+        pygame.draw.rect(win, color, (box_x, box_y, box_width, box_height), 2, border_radius=10)
         
         # Checkmark or lock icon
         icon_y = box_y + box_height // 2
         if ach["unlocked"]:
-            pygame.draw.circle(WIN, GREEN, (box_x + 30, icon_y), 15)
-            check = FONT_SMALL.render("✓", True, WHITE)
-            WIN.blit(check, (box_x + 30 - check.get_width()//2, icon_y - check.get_height()//2))
+            pygame.draw.circle(win, GREEN, (box_x + 30, icon_y), 15)
+            check = text_cache.render(FONT_SMALL, "✓", True, WHITE)
+            win.blit(check, (box_x + 30 - check.get_width()//2, icon_y - check.get_height()//2))
         else:
-            pygame.draw.circle(WIN, GRAY, (box_x + 30, icon_y), 15)
-            lock = FONT_SMALL.render("?", True, WHITE)
-            WIN.blit(lock, (box_x + 30 - lock.get_width()//2, icon_y - lock.get_height()//2))
+            pygame.draw.circle(win, GRAY, (box_x + 30, icon_y), 15)
+            lock = text_cache.render(FONT_SMALL, "?", True, WHITE)
+            win.blit(lock, (box_x + 30 - lock.get_width()//2, icon_y - lock.get_height()//2))
         
         # Draw achievement name and description
-        WIN.blit(name_text, (box_x + 60, box_y + 10))
-        WIN.blit(desc_text, (box_x + 60, box_y + 35))
+        win.blit(name_text, (box_x + 60, box_y + 10))
+        win.blit(desc_text, (box_x + 60, box_y + 35))
         
         y_offset += 70
         visible_count += 1
@@ -940,242 +767,454 @@ def draw_achievements():
     if len(achievements) > 8:
         current_page = achievement_scroll_offset // 8 + 1
         total_pages = (len(achievements) + 7) // 8
-        scroll_text = FONT_SMALL.render(f"Page {current_page}/{total_pages} - Use UP/DOWN to scroll", True, WHITE)
-        WIN.blit(scroll_text, (WIDTH//2 - scroll_text.get_width()//2, HEIGHT//1.1))
+        scroll_text = text_cache.render(FONT_SMALL, f"Page {current_page}/{total_pages} - Use UP/DOWN to scroll", True, WHITE)
+        win.blit(scroll_text, (WIDTH//2 - scroll_text.get_width()//2, HEIGHT//1.1))
     
-    back = FONT.render("Press BACKSPACE to Return", True, WHITE)
-    WIN.blit(back, (WIDTH//2 - back.get_width()//2, HEIGHT//1.05))
-    pygame.display.update()
+    back = text_cache.render(FONT, "Press BACKSPACE to Return", True, WHITE)
+    win.blit(back, (WIDTH//2 - back.get_width()//2, HEIGHT//1.05))
 
-def draw_game():
-    # Apply screen flash if active
-    if screen_flash > 0:
-        flash_surface = pygame.Surface((WIDTH, HEIGHT))
-        flash_surface.set_alpha(screen_flash)
+def draw_achievements():
+    screen_cache.present(WIN, ACHIEVEMENTS, (achievement_scroll_offset, tuple(a["unlocked"] for a in achievements.values())), render_achievements)
+
+# ---- GAME RENDERER ----
+game_renderer = DirtyRectRenderer()  # Gets its background on the first game frame
+level_background = None
+level_background_key = None
+
+# ---- PROFILER ----
+profiler = FrameProfiler(tracer=tracer)
+profiler_overlay = ProfilerOverlay(profiler, FONT_SMALL, text_cache)
+
+def build_level_background(cacti):
+    # Cacti never move, so they are baked into the background that
+    # gets restored under the dirty rects
+    surface = assets["background"].copy()
+    cactus = assets["cactus"]
+    surface.blits([(cactus, (obs.x, obs.y)) for obs in cacti], False)
+    return surface
+
+flash_surface = None  # Screen sized, only refilled when the flash color changes
+flash_surface_color = None
+flash_shown = False  # The last frame had a flash on it, the next one redraws everything to remove it
+
+def draw_flash():
+    # Colored overlay over the finished frame
+    global flash_surface, flash_surface_color
+    if flash_surface is None:
+        flash_surface = pygame.Surface((WIDTH, HEIGHT)).convert()
+    if flash_surface_color != flash_color:
+        flash_surface_color = flash_color
         flash_surface.fill(flash_color)
-        WIN.blit(flash_surface, (0, 0))
+    flash_surface.set_alpha(int(screen_flash))
+    WIN.blit(flash_surface, (0, 0))
+
+def draw_game(alpha=1.0):
+    # alpha: how far the frame is between the previous (0) and the last (1) simulation step
+    global level_background, level_background_key, flash_shown
+    boss = game.boss
+    
+    # Rebuild background when the obstacles changed (only if boss is not active)
+    background_key = None if boss else tuple(map(tuple, game.obstacles))
+    if level_background is None or background_key != level_background_key:
+        level_background_key = background_key
+        level_background = build_level_background([] if boss else game.obstacles)
+        game_renderer.set_background(level_background)
+    
+    # Shake and flash change the whole picture, so redraw everything
+    if screen_shake > 0 or screen_flash > 0 or flash_shown or not DIRTY_RECT_RENDERING:
+        game_renderer.invalidate()
     
     # Draw background
-    WIN.blit(background_img, (0, 0))
+    game_renderer.begin(WIN)
+    profiler.lap("draw_background")
     
+    # Each layer is collected first and drawn with a single blits() call
     # Draw particles
-    for particle in particles[:]:
-        particle.update()
-        particle.draw(WIN)
-        if particle.lifetime <= 0:
-            particles.remove(particle)
+    game_renderer.add(draw_particles(alpha))
+    profiler.lap("draw_particles")
 
     # Draw items
-    for item in items:
-        bob_offset = math.sin(time.time() * 5) * 3
-        WIN.blit(coin_img, (item.x, item.y + bob_offset))
-
-    # Draw obstacles (only if boss is not active)
-    if not boss:
-        for obs in obstacles:
-            WIN.blit(cactus_img, (obs.x, obs.y))
+    bob_offset = math.sin(game.time * 5) * 3
+    coin = assets["coin"]
+    game_renderer.extend(WIN.blits([(coin, (item.x, item.y + bob_offset)) for item in game.items]))
+    profiler.lap("draw_items")
 
     # Draw boss if active
     if boss:
-        boss.draw(WIN)
+        game_renderer.extend(get_boss_view().draw(WIN, boss, game.time, alpha))
         
         # Draw hearts for healing during boss battle
-        for heart in boss_hearts:
-            if not heart['collected']:
-                # Add a floating animation to hearts
-                float_offset = math.sin(time.time() * 3) * 5
-                WIN.blit(heart_img, (heart['rect'].x, heart['rect'].y + float_offset))
+        # Add a floating animation to hearts
+        float_offset = math.sin(game.time * 3) * 5
+        game_renderer.extend(WIN.blits([(assets["heart"], (heart['rect'].x, heart['rect'].y + float_offset))
+                                        for heart in game.hearts if not heart['collected']]))
+        profiler.lap("draw_boss")
 
     # Draw player
-    player.draw(WIN)
+    game_renderer.add(player.draw(WIN, game.player, alpha))
+    profiler.lap("draw_player")
     
     # Draw UI
-    score_text = FONT.render(f"Score: {score}", True, WHITE)
-    WIN.blit(score_text, (10, 10))
+    score_text = text_cache.render(FONT, f"Score: {game.score}", True, WHITE)
+    game_renderer.add(WIN.blit(score_text, (10, 10)))
     
-    if game_mode == "time_attack":
-        elapsed = int(time.time() - start_time - pause_offset)
-        timer_text = FONT.render(f"Time: {max(0, time_limit - elapsed)}", True, WHITE)
-        WIN.blit(timer_text, (10, 40))
+    if game.mode == "time_attack":
+        elapsed = int(game.time)
+        timer_text = text_cache.render(FONT, f"Time: {max(0, game.time_limit - elapsed)}", True, WHITE)
+        game_renderer.add(WIN.blit(timer_text, (10, 40)))
     
-    combo_text = FONT.render(f"Combo x{combo}", True, ORANGE)
-    WIN.blit(combo_text, (10, 70))
+    combo_text = text_cache.render(FONT, f"Combo x{game.combo}", True, ORANGE)
+    game_renderer.add(WIN.blit(combo_text, (10, 70)))
     
-    level_text = FONT.render(f"Level: {level}", True, WHITE)
-    WIN.blit(level_text, (10, 100))
+    level_text = text_cache.render(FONT, f"Level: {game.level}", True, WHITE)
+    game_renderer.add(WIN.blit(level_text, (10, 100)))
     
     # Difficulty indicator
-    diff_text = FONT_SMALL.render(f"Difficulty: {current_difficulty.title()}", True, WHITE)
-    WIN.blit(diff_text, (10, 130))
+    diff_text = text_cache.render(FONT_SMALL, f"Difficulty: {current_difficulty.title()}", True, WHITE)
+    game_renderer.add(WIN.blit(diff_text, (10, 130)))
     
     # Boss warning and player health during boss battle
     if boss:
         # Boss health
-        boss_text = FONT.render(f"BOSS HP: {boss.hp}/{boss.max_hp}", True, RED)
-        WIN.blit(boss_text, (WIDTH - boss_text.get_width() - 10, 10))
+        boss_text = text_cache.render(FONT, f"BOSS HP: {boss.hp}/{boss.max_hp}", True, RED)
+        game_renderer.add(WIN.blit(boss_text, (WIDTH - boss_text.get_width() - 10, 10)))
         
         # Player health during boss battle
-        health_text = FONT.render(f"Your Health: ", True, WHITE)
-        WIN.blit(health_text, (WIDTH - 200, 40))
+        health_text = text_cache.render(FONT, f"Your Health: ", True, WHITE)
+        game_renderer.add(WIN.blit(health_text, (WIDTH - 200, 40)))
         
         # Draw hearts for player health
         heart_spacing = 35
         start_x = WIDTH - 100
-        for i in range(max_boss_player_health):
+        for i in range(game.max_health):
             heart_x = start_x + (i * heart_spacing)
-            if i < boss_player_health:
+            if i < game.health:
                 # Full heart
-                WIN.blit(heart_img, (heart_x, 40))
+                game_renderer.add(WIN.blit(assets["heart"], (heart_x, 40)))
             else:
                 # Empty heart (draw in gray)
-                empty_heart = heart_img.copy()
-                empty_heart.fill((100, 100, 100, 255), special_flags=pygame.BLEND_RGBA_MULT)
-                WIN.blit(empty_heart, (heart_x, 40))
+                game_renderer.add(WIN.blit(assets["empty_heart"], (heart_x, 40)))
+    profiler.lap("draw_ui")
+
+    # Screen flash on top of everything, the frame is a full redraw already
+    flash_shown = screen_flash > 0
+    if flash_shown:
+        draw_flash()
+
+    if profiler.enabled:
+        game_renderer.add(profiler_overlay.draw(WIN))
     
-    pygame.display.update()
+    game_renderer.present()
+    profiler.lap("display_update")
 
-def draw_tutorial():
-    WIN.fill(GREEN)
+def render_tutorial(win):
+    win.fill(GREEN)
     
-    title = FONT.render("How to Play", True, BLACK)
-    mode_title = FONT.render("Time Attack Modes:", True, BLACK)
-    time_desc1 = FONT_SMALL.render("Collect as many coins as possible within the time limit", True, BLACK)
-    time_desc2 = FONT_SMALL.render("Avoid cacti - touching them ends the game!", True, RED)
-    time_desc3 = FONT_SMALL.render("Build combos by collecting coins quickly for bonus points", True, RED)
-    endless_title = FONT.render("Endless Mode:", True, BLACK)
-    endless_desc1 = FONT_SMALL.render("Survive as long as possible and reach higher levels", True, BLACK)
-    endless_desc2 = FONT_SMALL.render("Every 5 levels, face a BOSS enemy!", True, RED)
-    endless_desc3 = FONT_SMALL.render("During boss fights: Collect coins to damage the boss", True, RED)
-    endless_desc4 = FONT_SMALL.render("Dodge boss projectiles - you have 3 hearts!", True, RED)
-    endless_desc5 = FONT_SMALL.render("Collect heart items to restore health during boss battles", True, RED)
-    controls_title = FONT_SMALL.render("Controls: Arrow Keys/WASD to move, CTRL/SPACE for slow mode", True, BLACK)
-    back = FONT.render("Press BACKSPACE to Return", True, BLACK)
-    WIN.blit(title, (WIDTH//2 - title.get_width()//2, HEIGHT//4.5))
-    WIN.blit(mode_title, (WIDTH//2 - mode_title.get_width()//2, HEIGHT//3.5))
-    WIN.blit(time_desc1, (WIDTH//2 - time_desc1.get_width()//2, HEIGHT//3))
-    WIN.blit(time_desc2, (WIDTH//2 - time_desc2.get_width()//2, HEIGHT//2.7))
-    WIN.blit(time_desc3, (WIDTH//2 - time_desc3.get_width()//2, HEIGHT//2.4))
-    WIN.blit(endless_title, (WIDTH//2 - endless_title.get_width()//2, HEIGHT//2))
-    WIN.blit(endless_desc1, (WIDTH//2 - endless_desc1.get_width()//2, HEIGHT//1.8))
-    WIN.blit(endless_desc2, (WIDTH//2 - endless_desc2.get_width()//2, HEIGHT//1.7))
-    WIN.blit(endless_desc3, (WIDTH//2 - endless_desc3.get_width()//2, HEIGHT//1.6))
-    WIN.blit(endless_desc4, (WIDTH//2 - endless_desc4.get_width()//2, HEIGHT//1.5))
-    WIN.blit(endless_desc5, (WIDTH//2 - endless_desc5.get_width()//2, HEIGHT//1.4))
-    WIN.blit(controls_title, (WIDTH//2 - controls_title.get_width()//2, HEIGHT//1.2))
-    WIN.blit(back, (WIDTH//2 - back.get_width()//2, HEIGHT//1.1))
-    pygame.display.update()
+    title = text_cache.render(FONT, "How to Play", True, BLACK)
+    mode_title = text_cache.render(FONT, "Time Attack Modes:", True, BLACK)
+    time_desc1 = text_cache.render(FONT_SMALL, "Collect as many coins as possible within the time limit", True, BLACK)
+    time_desc2 = text_cache.render(FONT_SMALL, "Avoid cacti - touching them ends the game!", True, RED)
+    time_desc3 = text_cache.render(FONT_SMALL, "Build combos by collecting coins quickly for bonus points", True, RED)
+    endless_title = text_cache.render(FONT, "Endless Mode:", True, BLACK)
+    endless_desc1 = text_cache.render(FONT_SMALL, "Survive as long as possible and reach higher levels", True, BLACK)
+    endless_desc2 = text_cache.render(FONT_SMALL, "Every 5 levels, face a BOSS enemy!", True, RED)
+    endless_desc3 = text_cache.render(FONT_SMALL, "During boss fights: Collect coins to damage the boss", True, RED)
+    endless_desc4 = text_cache.render(FONT_SMALL, "Dodge boss projectiles - you have 3 hearts!", True, RED)
+    endless_desc5 = text_cache.render(FONT_SMALL, "Collect heart items to restore health during boss battles", True, RED)
+    controls_title = text_cache.render(FONT_SMALL, "Controls: Arrow Keys/WASD to move, CTRL/SPACE for slow mode", True, BLACK)
+    back = text_cache.render(FONT, "Press BACKSPACE to Return", True, BLACK)
+    win.blit(title, (WIDTH//2 - title.get_width()//2, HEIGHT//4.5))
+    win.blit(mode_title, (WIDTH//2 - mode_title.get_width()//2, HEIGHT//3.5))
+    win.blit(time_desc1, (WIDTH//2 - time_desc1.get_width()//2, HEIGHT//3))
+    win.blit(time_desc2, (WIDTH//2 - time_desc2.get_width()//2, HEIGHT//2.7))
+    win.blit(time_desc3, (WIDTH//2 - time_desc3.get_width()//2, HEIGHT//2.4))
+    win.blit(endless_title, (WIDTH//2 - endless_title.get_width()//2, HEIGHT//2))
+    win.blit(endless_desc1, (WIDTH//2 - endless_desc1.get_width()//2, HEIGHT//1.8))
+    win.blit(endless_desc2, (WIDTH//2 - endless_desc2.get_width()//2, HEIGHT//1.7))
+    win.blit(endless_desc3, (WIDTH//2 - endless_desc3.get_width()//2, HEIGHT//1.6))
+    win.blit(endless_desc4, (WIDTH//2 - endless_desc4.get_width()//2, HEIGHT//1.5))
+    win.blit(endless_desc5, (WIDTH//2 - endless_desc5.get_width()//2, HEIGHT//1.4))
+    win.blit(controls_title, (WIDTH//2 - controls_title.get_width()//2, HEIGHT//1.2))
+    win.blit(back, (WIDTH//2 - back.get_width()//2, HEIGHT//1.1))
+
+def draw_tutorial():
+    screen_cache.present(WIN, TUTORIAL, (), render_tutorial)
+
+def render_game_over(win):
+    win.fill(RED)
+    text = text_cache.render(FONT, "Game Over!", True, WHITE)
+    score_text = text_cache.render(FONT, f"Score: {game.score}", True, WHITE)
+    level_text = text_cache.render(FONT, f"Level Reached: {game.level}", True, WHITE)
+    restart = text_cache.render(FONT, "Press SPACE to Restart", True, WHITE)
+    win.blit(text, (WIDTH//2 - text.get_width()//2, HEIGHT//4))
+    win.blit(score_text, (WIDTH//2 - score_text.get_width()//2, HEIGHT//3))
+    win.blit(level_text, (WIDTH//2 - level_text.get_width()//2, HEIGHT//2.5))
+    win.blit(restart, (WIDTH//2 - restart.get_width()//2, HEIGHT//1.5))
 
 def draw_game_over():
-    WIN.fill(RED)
-    text = FONT.render("Game Over!", True, WHITE)
-    score_text = FONT.render(f"Score: {score}", True, WHITE)
-    level_text = FONT.render(f"Level Reached: {level}", True, WHITE)
-    restart = FONT.render("Press SPACE to Restart", True, WHITE)
-    WIN.blit(text, (WIDTH//2 - text.get_width()//2, HEIGHT//4))
-    WIN.blit(score_text, (WIDTH//2 - score_text.get_width()//2, HEIGHT//3))
-    WIN.blit(level_text, (WIDTH//2 - level_text.get_width()//2, HEIGHT//2.5))
-    WIN.blit(restart, (WIDTH//2 - restart.get_width()//2, HEIGHT//1.5))
-    pygame.display.update()
+    screen_cache.present(WIN, GAME_OVER, (game.score, game.level), render_game_over)
+
+def render_time_over(win):
+    win.fill(YELLOW)
+    text = text_cache.render(FONT, "Time Over!", True, BLACK)
+    score_text = text_cache.render(FONT, f"Score: {game.score}", True, BLACK)
+    restart = text_cache.render(FONT, "Press SPACE to Continue", True, WHITE)
+    win.blit(text, (WIDTH//2 - text.get_width()//2, HEIGHT//3))
+    win.blit(score_text, (WIDTH//2 - score_text.get_width()//2, HEIGHT//2))
+    win.blit(restart, (WIDTH//2 - restart.get_width()//2, HEIGHT//1.5))
 
 def draw_time_over():
-    WIN.fill(YELLOW)
-    text = FONT.render("Time Over!", True, BLACK)
-    score_text = FONT.render(f"Score: {score}", True, BLACK)
-    restart = FONT.render("Press SPACE to Continue", True, WHITE)
-    WIN.blit(text, (WIDTH//2 - text.get_width()//2, HEIGHT//3))
-    WIN.blit(score_text, (WIDTH//2 - score_text.get_width()//2, HEIGHT//2))
-    WIN.blit(restart, (WIDTH//2 - restart.get_width()//2, HEIGHT//1.5))
-    pygame.display.update()
+    screen_cache.present(WIN, TIME_OVER, (game.score,), render_time_over)
 
-def draw_new_highscore():
-    WIN.fill(GREEN)
-    text = FONT.render("New Highscore!", True, WHITE)
-    score_text = FONT.render(f"Score: {score}", True, WHITE)
-    restart = FONT.render("Press SPACE to Continue", True, WHITE)
-    WIN.blit(text, (WIDTH//2 - text.get_width()//2, HEIGHT//3))
-    WIN.blit(score_text, (WIDTH//2 - score_text.get_width()//2, HEIGHT//2))
-    WIN.blit(restart, (WIDTH//2 - restart.get_width()//2, HEIGHT//1.5))
-    pygame.display.update()
+def render_new_highscore(win):
+    win.fill(GREEN)
+    text = text_cache.render(FONT, "New Highscore!", True, WHITE)
+    score_text = text_cache.render(FONT, f"Score: {game.score}", True, WHITE)
+    restart = text_cache.render(FONT, "Press SPACE to Continue", True, WHITE)
+    win.blit(text, (WIDTH//2 - text.get_width()//2, HEIGHT//3))
+    win.blit(score_text, (WIDTH//2 - score_text.get_width()//2, HEIGHT//2))
+    win.blit(restart, (WIDTH//2 - restart.get_width()//2, HEIGHT//1.5))
 
-def draw_controls():
-    WIN.fill(GRAY)
-    title = FONT.render("Controls", True, WHITE)
-    move = FONT.render("Move: Arrow Keys or WASD", True, WHITE)
-    slow = FONT.render("Slow Mode: Hold CTRL or SPACE", True, WHITE)
-    pause = FONT.render("Pause: ESC", True, WHITE)
-    back = FONT.render("Press BACKSPACE to Return", True, WHITE)
+def draw_new_highscore():
+    screen_cache.present(WIN, NEW_HIGHSCORE, (game.score,), render_new_highscore)
+
+def render_controls(win):
+    win.fill(GRAY)
+    title = text_cache.render(FONT, "Controls", True, WHITE)
+    move = text_cache.render(FONT, "Move: Arrow Keys or WASD", True, WHITE)
+    slow = text_cache.render(FONT, "Slow Mode: Hold CTRL or SPACE", True, WHITE)
+    pause = text_cache.render(FONT, "Pause: ESC", True, WHITE)
+    back = text_cache.render(FONT, "Press BACKSPACE to Return", True, WHITE)
     
-    WIN.blit(title, (WIDTH//2 - title.get_width()//2, HEIGHT//4))
-    WIN.blit(move, (WIDTH//2 - move.get_width()//2, HEIGHT//2.5))
-    WIN.blit(slow, (WIDTH//2 - slow.get_width()//2, HEIGHT//2))
-    WIN.blit(pause, (WIDTH//2 - pause.get_width()//2, HEIGHT//1.65))
-    WIN.blit(back, (WIDTH//2 - back.get_width()//2, HEIGHT//1.3))
-    pygame.display.update()
+    win.blit(title, (WIDTH//2 - title.get_width()//2, HEIGHT//4))
+    win.blit(move, (WIDTH//2 - move.get_width()//2, HEIGHT//2.5))
+    win.blit(slow, (WIDTH//2 - slow.get_width()//2, HEIGHT//2))
+    win.blit(pause, (WIDTH//2 - pause.get_width()//2, HEIGHT//1.65))
+    win.blit(back, (WIDTH//2 - back.get_width()//2, HEIGHT//1.3))
 
-def draw_highscores():
-    WIN.fill(ORANGE)
-    title = FONT.render("Highscores", True, WHITE)
-    WIN.blit(title, (WIDTH//2 - title.get_width()//2, HEIGHT//6))
+def draw_controls():
+    screen_cache.present(WIN, CONTROLS, (), render_controls)
+
+def render_highscores(win):
+    win.fill(ORANGE)
+    title = text_cache.render(FONT, "Highscores", True, WHITE)
+    win.blit(title, (WIDTH//2 - title.get_width()//2, HEIGHT//6))
+    difficulty = text_cache.render(FONT, f"< {highscore_difficulty.title()} >", True, WHITE)
+    win.blit(difficulty, (WIDTH//2 - difficulty.get_width()//2, HEIGHT//6 + 45))
     
-    # Load highscores
-    if os.path.exists(highscore_file):
-        with open(highscore_file, "r") as f:
-            data = json.load(f)
-    else:
-        data = {}
+    data = highscores.scores
     
-    # Display highscores
-    y_offset = HEIGHT//3.5
-    time_labels = {"60": "1 Minute: ", "120": "2 Minutes: ", "300": "5 Minutes: ", "endless": "Endless Mode: "}
+    # Display the top runs per mode in columns, best of all difficulties under the header
+    time_labels = {"60": "1 Minute", "120": "2 Minutes", "300": "5 Minutes", "endless": "Endless Mode"}
     
-    for time_key in ["60", "120", "300", "endless"]:
-        label = time_labels[time_key]
-        score_val = data.get(time_key, 0)
-        # For endless mode, show levels instead of score
+    for column, time_key in enumerate(["60", "120", "300", "endless"]):
+        x_center = WIDTH * (2 * column + 1) // 8
+        y_offset = HEIGHT//3.5
+        label = text_cache.render(FONT, time_labels[time_key], True, WHITE)
+        win.blit(label, (x_center - label.get_width()//2, y_offset))
+        best = text_cache.render(FONT_SMALL, f"Best: {data.get(time_key, 0)}", True, WHITE)
+        win.blit(best, (x_center - best.get_width()//2, y_offset + 40))
+        y_offset += 90
+        
         if time_key == "endless":
-            text = FONT.render(f"{label}{score_val} Levels", True, WHITE)
+            top = run_history.top("endless", 0, highscore_difficulty)
         else:
-            text = FONT.render(f"{label}{score_val}", True, WHITE)
-        WIN.blit(text, (WIDTH//2 - text.get_width()//2, y_offset))
-        y_offset += 60
+            top = run_history.top("time_attack", int(time_key), highscore_difficulty)
+        for rank, (score_val, level) in enumerate(top, 1):
+            # For endless mode, show levels instead of score
+            if time_key == "endless":
+                text = text_cache.render(FONT, f"{rank}. Level {level}", True, WHITE)
+            else:
+                text = text_cache.render(FONT, f"{rank}. {score_val}", True, WHITE)
+            win.blit(text, (x_center - text.get_width()//2, y_offset))
+            y_offset += 45
+        if not top:
+            text = text_cache.render(FONT, "-", True, WHITE)
+            win.blit(text, (x_center - text.get_width()//2, y_offset))
     
-    back = FONT.render("Press BACKSPACE to Return", True, WHITE)
-    WIN.blit(back, (WIDTH//2 - back.get_width()//2, HEIGHT//1.15))
-    pygame.display.update()
+    change = text_cache.render(FONT_SMALL, "LEFT/RIGHT to change difficulty", True, WHITE)
+    win.blit(change, (WIDTH//2 - change.get_width()//2, HEIGHT//1.25))
+    back = text_cache.render(FONT, "Press BACKSPACE to Return", True, WHITE)
+    win.blit(back, (WIDTH//2 - back.get_width()//2, HEIGHT//1.15))
+
+def draw_highscores():
+    screen_cache.present(WIN, HIGHSCORES, (highscores.version, run_history.version, highscore_difficulty), render_highscores)
+
+# ------------------------------------------------------------
+#                        GAME UPDATE
+# ------------------------------------------------------------
+# Sounds and effects for what happened in the last core step
+# Game events that mark a transition, these show up as markers in a trace
+TRACED_EVENTS = ("level", "boss", "boss_defeated", "death", "achievement")
+
+def play_game_events(events):
+    global screen_shake, screen_flash, flash_color
+    for event in events:
+        kind = event[0]
+        if tracer.enabled and kind in TRACED_EVENTS:
+            tracer.instant(kind, "game", {"event": list(event[1:])} if len(event) > 1 else None)
+        if kind == "coin":
+            # Visual effect for collecting coin
+            assets["coin_sound"].play()
+            create_coin_particles(event[1], event[2])
+            screen_shake = 5
+            screen_flash = 30
+            flash_color = YELLOW
+        elif kind == "heart":
+            create_particles(event[1], event[2], RED, 20)
+            screen_shake = 3
+            screen_flash = 50
+            flash_color = GREEN
+        elif kind == "hit":
+            # Visual effect for getting hit
+            screen_shake = 15
+            screen_flash = 100
+            flash_color = RED
+            create_particles(event[1], event[2], RED, 20)
+        elif kind == "obstacle":
+            # Visual effect for hitting obstacle
+            screen_shake = 20
+            screen_flash = 150
+            flash_color = RED
+            create_particles(event[1], event[2], RED, 30)
+        elif kind == "death":
+            death_sound = assets["death_sound"]
+            if death_sound:
+                death_sound.play()
+        elif kind == "boss":
+            get_boss_view().animation.reset()
+        elif kind == "boss_defeated":
+            # Boss defeated visual effect
+            create_particles(event[1], event[2], PURPLE, 50)
+            create_particles(event[1], event[2], YELLOW, 30)
+            screen_shake = 25
+            screen_flash = 200
+            flash_color = PURPLE
+        elif kind == "achievement":
+            if not game_is_scripted:
+                save_achievements()
+            print(f"Achievement unlocked: {achievements[event[1]]['name']}")
+        elif kind == "level_full":
+            print(f"Level too full: placed {event[1]}/{event[2]} items, {event[3]}/{event[4]} obstacles")
+        elif kind == "error":
+            print(event[1])
+
+# One fixed simulation step of dt seconds.
+# Returns False when the frame should not be drawn anymore (the game ended on another screen).
+def update_game(inputs, dt):
+    global screen, game_initialized
+
+    if recording is not None:
+        recording.record(inputs)
+    step(game, inputs, dt, profiler if profiler.active else None)
+    player.update(game.player, dt)
+    particle_engine.update(dt)
+    profiler.lap("particles")
+    if game.boss:
+        get_boss_view().update(game.boss, game.time)
+    play_game_events(game.events)
+    profiler.lap("effects")
+    if not game_is_scripted:
+        achievement_store.total_coins_collected = game.total_coins_collected
+
+    if game.over:
+        tracer.instant(game.over, "game", {"score": game.score, "level": game.level})
+        save_recording()
+        record_run(game.over)
+        if not game_is_scripted:
+            save_achievements()  # Coins collected this game
+        if playback is not None:
+            finish_playback()
+
+    if game.over == "game_over":
+        screen = GAME_OVER
+        game_initialized = False
+        return True  # Teken de visuele effecten, de volgende frame tekent GAME_OVER
+
+    # Time check (only for time attack)
+    if game.over == "time_over":
+        if not game_is_scripted and highscores.submit(HighscoreStore.key(game.mode, game.time_limit), game.score):
+            screen = NEW_HIGHSCORE
+        else:
+            screen = TIME_OVER
+        game_initialized = False  # ← Dit toevoegen!
+        return False  # Stop verdere verwerking deze frame
+    return True
 
 # ------------------------------------------------------------
 #                        MAIN LOOP
 # ------------------------------------------------------------
+if "--replay" in sys.argv:
+    # Play a recorded game instead of starting at the menu
+    playback = Replay.load(sys.argv[sys.argv.index("--replay") + 1])
+    game_mode, time_limit, current_difficulty = playback.mode, playback.time_limit, playback.difficulty
+    screen = PLAYING
+    print(f"Playing replay: seed {playback.seed}, {playback.ticks} ticks")
+
+if "--benchmark" in sys.argv:
+    # python main.py --benchmark <scenario> <result file>, normally started by benchmark.py
+    from benchmark import BenchmarkRun  # Only benchmark runs pay for importing it
+    index = sys.argv.index("--benchmark")
+    benchmark_run = BenchmarkRun(sys.argv[index + 1], sys.argv[index + 2])
+    RENDER_FPS = 0
+    game_mode, time_limit = benchmark_run.scenario.mode, benchmark_run.scenario.time_limit
+    screen = PLAYING if game_mode else MENU
+
+def start_trace():
+    tracer.start(os.path.join(TRACE_DIR, time.strftime("%Y%m%d-%H%M%S") + ".trace.json"))
+
+if "--trace" in sys.argv:
+    start_trace()
+
 running = True
 esc_key_pressed = False  # Debounce for ESC key
 q_key_pressed = False  # Debounce for Q key
-pause_start = 0  # Track when pause started
-dt = 0  # Delta time for smooth animations
-last_achievement_scroll_time = 0
+sim_accumulator = 0  # Real time not simulated yet
+sim_dt = SIM_DT  # Step of the current game, a replay is played back at the rate it was recorded with
+last_scroll_time = 0
 scroll_delay = 0.15  # Delay between scrolls in seconds
+startup_reported = False  # Assets and time to the first frame are printed once that frame is shown
 
 while running:
-    CLOCK.tick(60)
-    dt = CLOCK.get_time() / 1000.0  # Convert to seconds
+    profiler.begin_frame()
+    CLOCK.tick(RENDER_FPS)
+    profiler.lap("wait")
+    # Same amount of simulation every frame in a benchmark, however long it took
+    game_clock.tick(FRAME_DT if benchmark_run is not None else None)
     
-    # Update visual effects
+    # Update visual effects (they fade per 1/60 s, not per frame)
     if screen_shake > 0:
-        screen_shake -= 1
+        screen_shake = max(0, screen_shake - game_clock.delta * 60)
     if screen_flash > 0:
-        screen_flash = max(0, screen_flash - 10)
+        screen_flash = max(0, screen_flash - 10 * game_clock.delta * 60)
     
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
             running = False
+        elif event.type == pygame.WINDOWEXPOSED:
+            # Window contents were lost, present everything again
+            screen_cache.invalidate()
+            game_renderer.invalidate()
+        elif event.type == pygame.KEYDOWN and event.key == PROFILER_KEY:
+            profiler.set_enabled(not profiler.enabled)
+            game_renderer.invalidate()  # Clear the overlay when it is switched off
+        elif event.type == pygame.KEYDOWN and event.key == TRACE_KEY:
+            if tracer.enabled:
+                tracer.stop()
+            else:
+                start_trace()
+    profiler.lap("events")
 
     keys = pygame.key.get_pressed()
-
-    # Apply difficulty settings
-    diff_settings = difficulty_settings[current_difficulty]
-    player_speed = diff_settings["player_speed"]
-    speed = slow_speed if keys[pygame.K_LCTRL] or keys[pygame.K_RCTRL] or keys[pygame.K_SPACE] else player_speed
+    profiler.lap("input")
 
     # --- SCREEN HANDLING ---
+    # Menus and the game paint over each other, so the next one starts from a full frame
+    if screen != PLAYING:
+        game_renderer.invalidate()
+    else:
+        screen_cache.invalidate()
+    
     if screen == MENU:
         draw_menu()
         if keys[pygame.K_SPACE]:
@@ -1184,6 +1223,7 @@ while running:
             screen = CONTROLS
         elif keys[pygame.K_s]:
             screen = HIGHSCORES
+            highscore_difficulty = current_difficulty
         elif keys[pygame.K_a]:
             screen = ACHIEVEMENTS
         elif keys[pygame.K_d]:
@@ -1195,20 +1235,28 @@ while running:
             screen = MENU
 
     elif screen == HIGHSCORES:
+        # Browse the leaderboards per difficulty, with the same delay as scrolling achievements
+        current_time = game_clock.real_time
+        if current_time - last_scroll_time > scroll_delay and (keys[pygame.K_LEFT] or keys[pygame.K_RIGHT]):
+            difficulties = list(difficulty_settings)
+            step_by = 1 if keys[pygame.K_RIGHT] else -1
+            highscore_difficulty = difficulties[(difficulties.index(highscore_difficulty) + step_by) % len(difficulties)]
+            last_scroll_time = current_time
+        
         draw_highscores()
         if keys[pygame.K_BACKSPACE]:
             screen = MENU
 
     elif screen == ACHIEVEMENTS:
         # Handle scrolling with delay to prevent too fast scrolling
-        current_time = time.time()
-        if current_time - last_achievement_scroll_time > scroll_delay:
+        current_time = game_clock.real_time
+        if current_time - last_scroll_time > scroll_delay:
             if keys[pygame.K_UP]:
                 achievement_scroll_offset = max(0, achievement_scroll_offset - 1)
-                last_achievement_scroll_time = current_time
+                last_scroll_time = current_time
             if keys[pygame.K_DOWN]:
                 achievement_scroll_offset = min(len(achievements) - 1, achievement_scroll_offset + 1)
-                last_achievement_scroll_time = current_time
+                last_scroll_time = current_time
         
         draw_achievements()
         if keys[pygame.K_BACKSPACE]:
@@ -1266,7 +1314,7 @@ while running:
         if keys[pygame.K_ESCAPE] and not esc_key_pressed:
             esc_key_pressed = True
             screen = PLAYING
-            pause_offset += time.time() - pause_start
+            game_clock.resume()
             pygame.mixer.music.unpause()  # Resume music
         elif not keys[pygame.K_ESCAPE]:
             esc_key_pressed = False
@@ -1275,27 +1323,20 @@ while running:
         if keys[pygame.K_q] and not q_key_pressed:
             q_key_pressed = True
             screen = MENU
+            save_recording()
+            record_run("quit")
+            stop_playback()
+            save_achievements()
+            game_initialized = False
+            game_clock.resume()
             pygame.mixer.music.unpause()  # Resume music
         elif not keys[pygame.K_q]:
             q_key_pressed = False
 
     elif screen in [GAME_OVER, TIME_OVER, NEW_HIGHSCORE]:
         # Save highscore for endless mode when game over
-        if screen == GAME_OVER and game_mode == "endless":
-            if level > highscore:  # Compare levels, not score
-                highscore = level
-                if os.path.exists(highscore_file):
-                    with open(highscore_file, "r") as f:
-                        data = json.load(f)
-                else:
-                    data = {}
-                data["endless"] = highscore
-                with open(highscore_file, "w") as f:
-                    json.dump(data, f)
-                
-                # Check difficulty master achievement
-                if current_difficulty == "insane" and level >= 10:
-                    unlock_achievement("difficulty_master")
+        if screen == GAME_OVER and game_mode == "endless" and not game_is_scripted:
+            highscores.submit("endless", game.level)  # Compare levels, not score
         
         if screen == GAME_OVER:
             draw_game_over()
@@ -1312,34 +1353,26 @@ while running:
         # Game initialization when first entering PLAYING
         if not game_initialized:
             game_initialized = True
-            
-            if os.path.exists(highscore_file):
-                with open(highscore_file, "r") as f:
-                    data = json.load(f)
-                    if game_mode == "endless":
-                        highscore = data.get("endless", 0)
-                    else:
-                        highscore = data.get(str(time_limit), 0)
+            assets.prefetch(GAME_ASSETS)
+            if player is None:
+                player = Player(assets["player_walk"], assets["player_shadow"])
+
+            # Difficulty and mode are fixed for the whole game
+            game_is_scripted = playback is not None or benchmark_run is not None
+            if playback is not None:
+                game = playback.new_game(pregen=level_pregen)
+                playback_inputs = playback.inputs()
+            elif benchmark_run is not None:
+                game = benchmark_run.new_game(BOSS_SIZE, pregen=level_pregen)
             else:
-                highscore = 0
-
-            player.x = WIDTH // 2
-            player.y = HEIGHT // 2
-            player.rect.topleft = (player.x, player.y)
-
-            items, obstacles = generate_level(20, 15, player.rect)
-            score = 0
-            combo = 0
-            last_collect_time = 0
-            start_time = time.time()  # ← Dit is cruciaal: starttijd resetten!
-            pause_offset = 0
-            level = 1
-            boss = None
-            level_start_time = time.time()
-            obstacles_touched = False
-            particles.clear()
-            boss_player_health = max_boss_player_health
-            boss_hearts.clear()
+                game = GameState(game_mode, time_limit, current_difficulty, achievements=achievements,
+                                 total_coins_collected=achievement_store.total_coins_collected,
+                                 boss_size=BOSS_SIZE, pregen=level_pregen)
+                recording = Replay(game.seed, game_mode, current_difficulty, time_limit, SIM_RATE, game.boss_size)
+            sim_dt = 1 / playback.sim_rate if playback is not None else SIM_DT
+            sim_accumulator = 0
+            particle_engine.clear()
+            play_game_events(game.events)  # From building the first level
             
             print(f"Nieuwe game gestart! Tijdslimiet: {time_limit}s, Mode: {game_mode}")  # Debug
 
@@ -1347,188 +1380,52 @@ while running:
         if keys[pygame.K_ESCAPE] and not esc_key_pressed:
             esc_key_pressed = True
             screen = PAUSED
-            pause_start = time.time()
+            game_clock.pause()  # Game time and the visual effects stand still
             pygame.mixer.music.pause()  # Pause music
         elif not keys[pygame.K_ESCAPE]:
             esc_key_pressed = False
 
-        # Player update
-        player.update(keys, speed)
-        
-        # Update boss if active
-        if boss:
-            boss.update(dt, player.rect)
-            
-            # Spawn coins periodically during boss battle
-            boss.try_spawn_coin(items, player.rect)
-            
-            # Spawn hearts at the start of boss battle if not already spawned
-            if not boss.hearts_spawned:
-                boss.spawn_hearts()
-                boss.hearts_spawned = True
-            
-            # Check boss projectiles collision
-            for proj in boss.projectiles[:]:
-                proj_rect = pygame.Rect(proj[0] - 10, proj[1] - 10, 20, 20)
-                if player.rect.colliderect(proj_rect):
-                    # Remove the projectile
-                    if proj in boss.projectiles:
-                        boss.projectiles.remove(proj)
-                    
-                    # Decrease player health during boss battle
-                    boss_player_health -= 1
-                    
-                    # Visual effect for getting hit
-                    screen_shake = 15
-                    screen_flash = 100
-                    flash_color = RED
-                    create_particles(player.rect.centerx, player.rect.centery, RED, 20)
-                    
-                    # Check if player is dead
-                    if boss_player_health <= 0:
-                        if death_sound:
-                            death_sound.play()
-                        screen = GAME_OVER
-                        game_initialized = False
-                        break
-
-        # Coin collisions
-        current_time = time.time()
-        collected = [item for item in items if player.rect.colliderect(item)]
-        for c in collected:
-            items.remove(c)
-            coin_sound.play()
-            
-            # Visual effect for collecting coin
-            create_coin_particles(c.x, c.y)
-            screen_shake = 5
-            screen_flash = 30
-            flash_color = YELLOW
-            
-            if current_time - last_collect_time - pause_offset <= combo_time:
-                combo += 1
-            else:
-                combo = 1
-
-            last_collect_time = current_time - pause_offset
-            score += 1 * combo
-            
-            # Update total coins
-            total_coins_collected += 1
-            
-            # If boss is active, damage boss when collecting coins
-            if boss:
-                boss.take_damage(5 * combo)  # Each coin damages boss
-
-        # Check heart collection during boss battle
-        if boss:
-            for heart in boss_hearts[:]:
-                if not heart['collected'] and player.rect.colliderect(heart['rect']):
-                    heart['collected'] = True
-                    boss_player_health = min(max_boss_player_health, boss_player_health + 1)
-                    create_particles(heart['rect'].centerx, heart['rect'].centery, RED, 20)
-                    screen_shake = 3
-                    screen_flash = 50
-                    flash_color = GREEN
-
-        if current_time - last_collect_time - pause_offset > combo_time:
-            combo = 0
-
-        # Check obstacle collision (only if boss is not active)
-        game_over_triggered = False
-        if not boss:
-            for obs in obstacles:
-                if player.rect.colliderect(obs):
-                    obstacles_touched = True
-                    # Visual effect for hitting obstacle
-                    screen_shake = 20
-                    screen_flash = 150
-                    flash_color = RED
-                    create_particles(player.rect.centerx, player.rect.centery, RED, 30)
-                    
-                    if death_sound:
-                        death_sound.play()
-                    game_over_triggered = True
-                    screen = GAME_OVER
-                    game_initialized = False
-                    break
-        
-        # Als game over getriggerd is, teken dan nog één keer het spel en ga dan verder
-        if game_over_triggered:
-            draw_game()  # Teken de visuele effecten
-            continue  # Ga naar volgende frame (die dan GAME_OVER tekent)
-
-        # Time check (only for time attack)
-        if game_mode == "time_attack":
-            elapsed = current_time - start_time - pause_offset
-            if elapsed >= time_limit:
-                if score > highscore:
-                    highscore = score
-                    if os.path.exists(highscore_file):
-                        with open(highscore_file, "r") as f:
-                            data = json.load(f)
-                    else:
-                        data = {}
-                    data[str(time_limit)] = highscore  # update alleen huidige time_limit
-                    with open(highscore_file, "w") as f:
-                        json.dump(data, f)
-                    screen = NEW_HIGHSCORE
-                else:
-                    screen = TIME_OVER
-                game_initialized = False  # ← Dit toevoegen!
-                continue  # Stop verdere verwerking deze frame
-
-        # Level up
-        if not items and not boss:
-            level += 1
-            level_start_time = time.time()
-            obstacles_touched = False
-            
-            # Check for boss level (every 5 levels in endless mode)
-            if game_mode == "endless" and level % 5 == 0:
-                boss = Boss()
-                # Reset player health for boss battle
-                boss_player_health = max_boss_player_health
-                # Clear all obstacles during boss battle
-                obstacles.clear()
-                # Clear existing coins
-                items.clear()
-                # Clear hearts
-                boss_hearts.clear()
-                # Unlock boss slayer achievement
-                unlock_achievement("boss_slayer")
-            else:
-                new_obstacles = 15 + random.randint(0, 5) + level
-                items, obstacles = generate_level(20, new_obstacles, player.rect, safe_radius=150)
-        
-        # Check if boss is defeated
-        if boss and boss.hp <= 0:
-            # Boss defeated visual effect
-            create_particles(boss.x, boss.y, PURPLE, 50)
-            create_particles(boss.x, boss.y, YELLOW, 30)
-            screen_shake = 25
-            screen_flash = 200
-            flash_color = PURPLE
-            
-            boss = None
-            boss_hearts.clear()  # Clear any remaining hearts
-            # Generate next level after boss
-            new_obstacles = 15 + random.randint(0, 5) + level
-            items, obstacles = generate_level(20, new_obstacles, player.rect, safe_radius=150)
-            # Add bonus score for defeating boss
-            score += 100 * combo
-
-        # Check achievements
-        check_achievements()
-        
-        draw_game()
+        # Fixed-timestep simulation, rendering blends between the last two steps
+        sim_accumulator += game_clock.delta
+        draw = True
+        while sim_accumulator >= sim_dt:
+            sim_accumulator -= sim_dt
+            inputs = next_inputs(keys)
+            if inputs is None:
+                # End of the replay
+                screen = MENU
+                draw = False
+                break
+            draw = update_game(inputs, sim_dt)
+            if screen != PLAYING:
+                sim_accumulator = 0
+                break
+
+        if draw:
+            draw_game(sim_accumulator / sim_dt)
 
     else:
         game_initialized = False
 
-# Save achievements before quitting
-with open(achievements_file, "w") as f:
-    json.dump(achievements, f)
+    profiler.end_frame()
+    if not startup_reported:
+        startup_reported = True
+        startup_time = time.perf_counter() - STARTUP_START
+        assets.report(f"First frame after {startup_time * 1000:.0f} ms (imports {startup_import_time * 1000:.0f} ms)")
+    if benchmark_run is not None and not benchmark_run.end_frame(particle_engine):
+        running = False
 
+# Save achievements before quitting
+save_achievements()
+if game_initialized:
+    save_recording()
+    record_run("quit")
+
+level_pregen.shutdown()
+file_writer.close()
+run_history.close()
+tracer.stop()
+if benchmark_run is not None:
+    benchmark_run.finish()
 pygame.quit()
 sys.exit()
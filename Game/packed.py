@@ -0,0 +1,69 @@
+import numpy as np
+
+
+# ------------------------------------------------------------
+#                     PACKED ARRAYS
+# ------------------------------------------------------------
+# Base for stores that keep their objects in preallocated arrays (structure of
+# arrays), live ones always packed at the front: [0, count). Every object has a
+# position and the position before the last update, so it can be drawn between
+# two simulation steps.
+class PackedArrays:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.count = 0
+        self.arrays = []  # Every per-object array, compact() moves them together
+        self.x = self.array(np.float32)
+        self.y = self.array(np.float32)
+        self.prev_x = self.array(np.float32)  # Position before the last update, for interpolation
+        self.prev_y = self.array(np.float32)
+
+    def array(self, dtype, fill=0):
+        array = np.full(self.capacity, fill, dtype=dtype)
+        self.arrays.append(array)
+        return array
+
+    def add(self, count, x, y):
+        # Room for count new objects at (x, y), fewer when the capacity is reached.
+        # Returns (start, end), the caller fills in the other arrays.
+        count = max(0, min(count, self.capacity - self.count))
+        start, end = self.count, self.count + count
+        self.x[start:end] = x
+        self.y[start:end] = y
+        self.prev_x[start:end] = x
+        self.prev_y[start:end] = y
+        self.count = end
+        return start, end
+
+    def move(self, dx, dy):
+        # Moves the live objects by dx, dy (arrays of length count)
+        n = self.count
+        self.prev_x[:n] = self.x[:n]
+        self.prev_y[:n] = self.y[:n]
+        self.x[:n] += dx
+        self.y[:n] += dy
+
+    def compact(self, keep):
+        # keep: bool array of length count, the rest is removed and the kept ones packed to the front
+        n = self.count
+        kept = int(np.count_nonzero(keep))
+        if kept != n:
+            for array in self.arrays:
+                array[:kept] = array[:n][keep]
+            self.count = kept
+
+    def interpolated(self, alpha=1.0):
+        # (x, y) of the live objects, alpha blends from the previous (0) to the current (1) position
+        n = self.count
+        x = self.x[:n]
+        y = self.y[:n]
+        if alpha != 1.0:
+            x = self.prev_x[:n] + (x - self.prev_x[:n]) * alpha
+            y = self.prev_y[:n] + (y - self.prev_y[:n]) * alpha
+        return x, y
+
+    def clear(self):
+        self.count = 0
+
+    def __len__(self):
+        return self.count
@@ -0,0 +1,98 @@
+import math
+
+import numpy as np
+
+from packed import PackedArrays
+
+
+# ------------------------------------------------------------
+#                    PARTICLE ENGINE
+# ------------------------------------------------------------
+# All particles live in preallocated arrays, see packed.py.
+# Speeds, gravity and lifetimes are per 1/60 s, update(dt) scales them to the step size.
+class ParticleEngine(PackedArrays):
+    def __init__(self, capacity=16384, gravity=0.1, color_step=32, rng=None):
+        super().__init__(capacity)
+        self.gravity = gravity
+        self.color_step = color_step  # Random colors are snapped so they share palette entries (and sprites)
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+        self.vx = self.array(np.float32)
+        self.vy = self.array(np.float32)
+        self.size = self.array(np.float32)
+        self.lifetime = self.array(np.float32)
+        self.max_lifetime = self.array(np.float32, fill=1)
+        self.color_id = self.array(np.int32)
+
+        self.palette = []  # color_id -> (r, g, b)
+        self.palette_ids = {}
+
+    def _random_channel(self, low, high, count):
+        # Random values in [low, high], snapped to the middle of their color_step bucket.
+        # Clipped to the range, so a fixed channel like (0, 0) stays exact.
+        step = self.color_step
+        values = self.rng.integers(low, high + 1, count)
+        return np.clip((values // step) * step + step // 2, low, high)
+
+    def _color_ids(self, colors):
+        # colors: (n, 3) int array -> palette ids
+        keys = (colors[:, 0] << 16) | (colors[:, 1] << 8) | colors[:, 2]
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        ids = np.empty(len(unique_keys), dtype=np.int32)
+        for i, key in enumerate(unique_keys.tolist()):
+            color_id = self.palette_ids.get(key)
+            if color_id is None:
+                color_id = len(self.palette)
+                self.palette.append(((key >> 16) & 255, (key >> 8) & 255, key & 255))
+                self.palette_ids[key] = color_id
+            ids[i] = color_id
+        return ids[inverse]
+
+    def emit(self, x, y, count, color=None, color_range=None,
+             speed=(1, 5), size=(2, 8), lifetime=(20, 40)):
+        # Burst of count particles flying out in random directions from (x, y).
+        # color is one (r, g, b), color_range is ((r_min, r_max), (g_min, g_max), (b_min, b_max)).
+        # Particles that do not fit in the capacity are dropped.
+        start, end = self.add(count, x, y)
+        count = end - start
+        if count == 0:
+            return 0
+        rng = self.rng
+
+        angle = rng.uniform(0, 2 * math.pi, count)
+        velocity = rng.uniform(speed[0], speed[1], count)
+        self.vx[start:end] = np.cos(angle) * velocity
+        self.vy[start:end] = np.sin(angle) * velocity
+        self.size[start:end] = rng.uniform(size[0], size[1], count)
+        life = rng.integers(lifetime[0], lifetime[1] + 1, count)
+        self.lifetime[start:end] = life
+        self.max_lifetime[start:end] = life
+
+        if color_range is not None:
+            colors = np.stack([self._random_channel(low, high, count) for low, high in color_range], axis=1)
+        else:
+            colors = np.array([color[:3]], dtype=np.int64)  # Exact, effects keep their own color
+        ids = self._color_ids(colors.astype(np.int64))
+        self.color_id[start:end] = ids if len(ids) == count else ids[0]
+        return count
+
+    def update(self, dt=1 / 60):
+        n = self.count
+        if n == 0:
+            return
+        steps = dt * 60
+        self.move(self.vx[:n] * steps, self.vy[:n] * steps)
+        self.lifetime[:n] -= steps
+        self.vy[:n] += self.gravity * steps
+
+        # Cull dead particles, the live ones stay packed at the front
+        self.compact(self.lifetime[:n] > 0)
+
+    def visible(self, alpha=1.0):
+        # (color_id, radius, x, y) arrays of the particles big enough to draw.
+        # alpha blends between the previous (0) and current (1) position.
+        n = self.count
+        radius = (self.size[:n] * (self.lifetime[:n] / self.max_lifetime[:n])).astype(np.int32)
+        shown = radius > 0
+        x, y = self.interpolated(alpha)
+        return self.color_id[:n][shown], radius[shown], x[shown].astype(np.int32), y[shown].astype(np.int32)
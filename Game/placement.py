@@ -0,0 +1,166 @@
+import math
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+from spatial_hash import SpatialHash
+
+
+# ------------------------------------------------------------
+#                 POISSON-DISK PLACEMENT
+# ------------------------------------------------------------
+# Bridson's algorithm: grow a set of points that are all at least min_distance
+# apart, trying k candidates around every point before retiring it. Every point
+# is retired exactly once, so the work is bounded by k * (number of points).
+# Distance is measured per axis (the larger of |dx| and |dy|), so for squares
+# "min_distance >= size" means exactly "does not overlap".
+# The final layout is a random pick from that set, so it is spread evenly
+# instead of clustering around the first point. A Poisson-disk set packs less
+# tightly than random placement, so when it comes out short the rest is topped
+# up with fill() in the gaps it left.
+class PlacementEngine:
+    def __init__(self, width, height, rng=None, k=12, extra_seeds=30):
+        self.width = width
+        self.height = height
+        self.rng = rng or random
+        self.k = k  # Candidates per point before it is retired
+        self.extra_seeds = extra_seeds  # Random restarts for areas the growth could not reach
+
+    def place(self, count, size, avoid=(), min_distance=None, attempts=50):
+        # count rects of size x size inside the screen, not overlapping each other.
+        # avoid: list of (spatial_hash, margin), new rects stay margin px away from everything in them.
+        # Returns the placed rects, fewer than count only when fill() can't find room either.
+        # attempts: how hard fill() tries, see there.
+        if count <= 0:
+            return []
+        min_distance = max(min_distance or 0, size)
+        rng = self.rng
+        max_x = self.width - size
+        max_y = self.height - size
+        if max_x < 0 or max_y < 0:
+            return []
+
+        # Background grid with cells small enough to hold one point each,
+        # padded with an empty cell on every side so lookups need no bounds checks
+        cell = min_distance
+        cols = int(max_x / cell) + 3
+        rows = int(max_y / cell) + 3
+        grid = [None] * (cols * rows)
+        neighbours = [r * cols + c for r in range(-1, 2) for c in range(-1, 2)]
+
+        points = []
+        active = []
+
+        def fits(x, y):
+            if x < 0 or y < 0 or x > max_x or y > max_y:
+                return False
+            index = (int(y / cell) + 1) * cols + int(x / cell) + 1
+            for offset in neighbours:
+                other = grid[index + offset]
+                if other is not None and abs(other[0] - x) < min_distance and abs(other[1] - y) < min_distance:
+                    return False
+            if avoid:
+                rect = pygame.Rect(int(x), int(y), size, size)
+                for spatial_hash, margin in avoid:
+                    if spatial_hash.collides(rect.inflate(margin * 2, margin * 2)):
+                        return False
+            return True
+
+        def add(x, y):
+            grid[(int(y / cell) + 1) * cols + int(x / cell) + 1] = (x, y)
+            points.append(pygame.Rect(int(x), int(y), size, size))
+            active.append((x, y))
+
+        for _ in range(self.extra_seeds + 1):
+            x = rng.uniform(0, max_x)
+            y = rng.uniform(0, max_y)
+            if not fits(x, y):
+                continue
+            add(x, y)
+
+            while active:
+                index = rng.randrange(len(active))
+                px, py = active[index]
+                for _ in range(self.k):
+                    angle = rng.uniform(0, 2 * math.pi)
+                    distance = rng.uniform(min_distance, 2 * min_distance)
+                    x = px + math.cos(angle) * distance
+                    y = py + math.sin(angle) * distance
+                    if fits(x, y):
+                        add(x, y)
+                        break
+                else:
+                    # No room left around this point
+                    active[index] = active[-1]
+                    active.pop()
+
+        if len(points) >= count:
+            return rng.sample(points, count)
+        placed = SpatialHash(max(min_distance, 1))
+        placed.rebuild(points)
+        return points + self.fill(count - len(points), size, list(avoid) + [(placed, min_distance - size)], attempts)
+
+    def fill(self, count, size, avoid=(), attempts=50):
+        # Top up a few rects in an almost finished layout with random spots, which is much
+        # cheaper than place() when little is missing. Gives up after attempts misses in a row.
+        placed = SpatialHash(max(size, 1))
+        avoid = list(avoid) + [(placed, 0)]
+        rects = []
+        misses = 0
+        while len(rects) < count and misses < attempts:
+            rect = pygame.Rect(self.rng.randint(0, self.width - size), self.rng.randint(0, self.height - size), size, size)
+            if any(spatial_hash.collides(rect.inflate(margin * 2, margin * 2)) for spatial_hash, margin in avoid):
+                misses += 1
+                continue
+            rects.append(rect)
+            placed.insert(rect)
+            misses = 0
+        return rects
+
+
+# ------------------------------------------------------------
+#                 NEXT LEVEL PREGENERATION
+# ------------------------------------------------------------
+# Builds the next layout on a worker thread while the current level is played.
+# Requests are tagged with a key (the level they are for), take() only hands
+# out a layout that was requested for that key.
+class LevelPregenerator:
+    def __init__(self, generate):
+        self.generate = generate  # generate(*args) -> layout, must not touch shared game state
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="level-pregen")
+        self.key = None
+        self.future = None
+
+    def request(self, key, *args):
+        self.cancel()
+        self.key = key
+        self.future = self.executor.submit(self.generate, *args)
+
+    def take(self, key):
+        # The layout requested for key, or None if there is none.
+        # Waits for the worker when it is not done yet, which only happens right after request().
+        future = self.future
+        if future is None or self.key != key:
+            return None
+        self.key = None
+        self.future = None
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"Level pregeneration failed: {e}")
+            return None
+
+    def submit(self, fn, *args):
+        # Other work for the worker thread, runs before anything requested after it
+        return self.executor.submit(fn, *args)
+
+    def cancel(self):
+        if self.future is not None:
+            self.future.cancel()
+        self.key = None
+        self.future = None
+
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False)
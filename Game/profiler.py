@@ -0,0 +1,158 @@
+import time
+
+import numpy as np
+import pygame
+
+perf_counter_ns = time.perf_counter_ns
+
+
+# ------------------------------------------------------------
+#                     FRAME PROFILER
+# ------------------------------------------------------------
+# Splits every frame into named phases. lap(name) books the time since the
+# previous lap on name, so one call per phase is enough. While disabled every
+# call returns right away, so the instrumentation can stay in the main loop.
+# With a running tracing.Tracer every lap is also written to the trace as a span.
+class FrameProfiler:
+    def __init__(self, history=600, tracer=None):
+        self.enabled = False  # Keep stats for the overlay
+        self.tracer = tracer
+        self.active = False  # Enabled or tracing, decided once per frame
+        self.history = history  # Frames kept per phase for the percentiles
+        self.phases = {}  # name -> ring buffer of ns per frame
+        self.order = []  # Phase names in the order they first ran
+        self.frame = {}  # name -> ns in the current frame
+        self.frames = 0  # Frames recorded, also the ring buffer write position
+        self.frame_start = 0
+        self.last = 0
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        if enabled:
+            self.reset()
+
+    def reset(self):
+        self.phases.clear()
+        self.order.clear()
+        self.frame = {}
+        self.frames = 0
+
+    def begin_frame(self):
+        tracer = self.tracer
+        self.active = self.enabled or (tracer is not None and tracer.enabled)
+        if not self.active:
+            return
+        self.frame = {}
+        self.frame_start = self.last = perf_counter_ns()
+
+    def lap(self, name):
+        if not self.active:
+            return
+        now = perf_counter_ns()
+        self.frame[name] = self.frame.get(name, 0) + now - self.last
+        if self.tracer is not None:
+            self.tracer.complete(name, "frame", self.last, now - self.last)
+        self.last = now
+
+    def end_frame(self):
+        if not self.active:
+            return
+        self.lap("other")
+        if self.tracer is not None:
+            self.tracer.complete("frame", "frame", self.frame_start, self.last - self.frame_start)
+            self.tracer.maybe_flush()
+        if not self.enabled:
+            return
+        frame = self.frame
+        frame["frame"] = sum(frame.values()) - frame.get("wait", 0)
+        index = self.frames % self.history
+        for name, ns in frame.items():
+            samples = self.phases.get(name)
+            if samples is None:
+                # Frames before the phase first ran count as 0
+                samples = np.zeros(self.history, dtype=np.int64)
+                self.phases[name] = samples
+                self.order.append(name)
+            samples[index] = ns
+        for name, samples in self.phases.items():
+            if name not in frame:
+                samples[index] = 0
+        self.frames += 1
+
+    def samples(self, name):
+        # ns per frame of one phase, oldest first
+        samples = self.phases.get(name)
+        if samples is None:
+            return np.zeros(0, dtype=np.int64)
+        count = min(self.frames, self.history)
+        if self.frames <= self.history:
+            return samples[:count]
+        start = self.frames % self.history
+        return np.concatenate((samples[start:], samples[:start]))
+
+    def stats(self):
+        # name -> (p50, p95, p99, max) in ms over the kept frames
+        result = {}
+        for name in self.order:
+            samples = self.samples(name)
+            if len(samples):
+                p50, p95, p99 = np.percentile(samples, (50, 95, 99)) / 1e6
+                result[name] = (p50, p95, p99, samples.max() / 1e6)
+        return result
+
+
+# ------------------------------------------------------------
+#                    PROFILER OVERLAY
+# ------------------------------------------------------------
+# Table of the phase percentiles plus a graph of the last frame times.
+# The panel is only rebuilt every refresh_frames frames, drawing it stays cheap.
+class ProfilerOverlay:
+    def __init__(self, profiler, font, text_cache, budget_ms=1000 / 60, refresh_frames=15):
+        self.profiler = profiler
+        self.font = font
+        self.text_cache = text_cache
+        self.budget_ms = budget_ms  # Drawn as a line in the graph
+        self.refresh_frames = refresh_frames
+        self.panel = None
+        self.built_at = -1
+
+    def build(self):
+        stats = self.profiler.stats()
+        line_height = self.font.get_linesize()
+        graph_height = 60
+        width = 380
+        height = (len(stats) + 1) * line_height + graph_height + 20
+        panel = pygame.Surface((width, height), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 180))
+
+        columns = (10, 150, 205, 260, 315)
+        header = ("phase (ms)", "p50", "p95", "p99", "max")
+        for x, text in zip(columns, header):
+            panel.blit(self.text_cache.render(self.font, text, True, (255, 255, 0)), (x, 5))
+        y = 5 + line_height
+        for name, values in stats.items():
+            color = (255, 120, 120) if name == "frame" else (255, 255, 255)
+            panel.blit(self.text_cache.render(self.font, name, True, color), (columns[0], y))
+            for x, value in zip(columns[1:], values):
+                panel.blit(self.text_cache.render(self.font, f"{value:.2f}", True, color), (x, y))
+            y += line_height
+
+        # Frame time graph, newest on the right
+        frames = self.profiler.samples("frame")[-(width - 20):] / 1e6
+        graph = pygame.Rect(10, y + 5, width - 20, graph_height)
+        scale = graph.height / max(self.budget_ms * 2, frames.max() if len(frames) else 0)
+        budget_y = graph.bottom - self.budget_ms * scale
+        pygame.draw.line(panel, (0, 200, 0), (graph.left, budget_y), (graph.right, budget_y))
+        if len(frames) > 1:
+            points = [(graph.left + i, graph.bottom - ms * scale) for i, ms in enumerate(frames.tolist())]
+            pygame.draw.lines(panel, (255, 120, 120), False, points)
+        self.panel = panel
+        self.built_at = self.profiler.frames
+
+    def draw(self, win, pos=(10, 170)):
+        # Returns the rect drawn on, None while there is nothing to show
+        if self.profiler.frames == 0:
+            return None
+        if self.panel is None or self.profiler.frames - self.built_at >= self.refresh_frames:
+            self.build()
+        return win.blit(self.panel, pos)
@@ -0,0 +1,67 @@
+import numpy as np
+
+from packed import PackedArrays
+
+
+# ------------------------------------------------------------
+#                   PROJECTILE STORE
+# ------------------------------------------------------------
+# Boss projectiles in preallocated arrays, see packed.py.
+class ProjectileStore(PackedArrays):
+    def __init__(self, width, height, capacity=4096, margin=50):
+        super().__init__(capacity)
+        self.width = width
+        self.height = height
+        self.margin = margin  # How far outside the screen a projectile may fly before it is removed
+        self.dx = self.array(np.float32)
+        self.dy = self.array(np.float32)
+        self.speed = self.array(np.float32)
+        self.radius = self.array(np.float32)
+
+    def spawn(self, x, y, dx, dy, speed=5, radius=10):
+        # Every argument can be a scalar or an array, one projectile per direction
+        dx = np.atleast_1d(np.asarray(dx, dtype=np.float32))
+        dy = np.atleast_1d(np.asarray(dy, dtype=np.float32))
+        total = max(len(dx), len(dy))
+        start, end = self.add(total, x, y)
+        count = end - start
+        self.dx[start:end] = np.broadcast_to(dx, (total,))[:count]
+        self.dy[start:end] = np.broadcast_to(dy, (total,))[:count]
+        self.speed[start:end] = speed
+        self.radius[start:end] = radius
+        return count
+
+    def update(self, dt):
+        # speed is in pixels per 1/60 s, like the rest of the game
+        n = self.count
+        if n == 0:
+            return
+        step = self.speed[:n] * (dt * 60)
+        self.move(self.dx[:n] * step, self.dy[:n] * step)
+
+        # Remove projectiles that left the screen
+        margin = self.margin
+        x = self.x[:n]
+        y = self.y[:n]
+        self.compact((x >= -margin) & (x <= self.width + margin) & (y >= -margin) & (y <= self.height + margin))
+
+    def hit_rect(self, rect):
+        # Circle vs rect test for all projectiles, hit ones are removed. Returns the number of hits.
+        n = self.count
+        if n == 0:
+            return 0
+        x = self.x[:n]
+        y = self.y[:n]
+        nearest_x = np.clip(x, rect.left, rect.right)
+        nearest_y = np.clip(y, rect.top, rect.bottom)
+        dist_sq = (x - nearest_x) ** 2 + (y - nearest_y) ** 2
+        hit = dist_sq < self.radius[:n] ** 2
+        hits = int(np.count_nonzero(hit))
+        if hits:
+            self.compact(~hit)
+        return hits
+
+    def positions(self, alpha=1.0):
+        # (n, 2) int array of projectile centers
+        x, y = self.interpolated(alpha)
+        return np.stack((x, y), axis=1).astype(np.int32)
@@ -0,0 +1,376 @@
+import pygame
+import hashlib
+import json
+import os
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+
+# ------------------------------------------------------------
+#                  DIRTY RECT RENDERING
+# ------------------------------------------------------------
+def merge_rects(rects):
+    # Union overlapping rects so display.update gets a short list
+    merged = []
+    for rect in rects:
+        rect = pygame.Rect(rect)
+        i = 0
+        while i < len(merged):
+            if rect.colliderect(merged[i]):
+                rect.union_ip(merged.pop(i))
+                i = 0
+            else:
+                i += 1
+        merged.append(rect)
+    return merged
+
+
+class DirtyRectRenderer:
+    def __init__(self, background=None, max_dirty_ratio=0.5):
+        self.background = background  # Can be set later with set_background(), before the first begin()
+        # Above this part of the screen a full update is cheaper than many rects
+        self.max_dirty_ratio = max_dirty_ratio
+        self.old_rects = []
+        self.new_rects = []
+        self.full_redraw = True
+
+    def set_background(self, background):
+        if background is not self.background:
+            self.background = background
+            self.full_redraw = True
+
+    def invalidate(self):
+        self.full_redraw = True
+
+    def begin(self, win):
+        # Restore the background only under what was drawn last frame
+        if self.full_redraw:
+            win.blit(self.background, (0, 0))
+        else:
+            for rect in self.old_rects:
+                win.blit(self.background, rect, rect)
+        self.new_rects = []
+
+    def add(self, rect):
+        # Blits and pygame.draw calls return the (clipped) rect they touched
+        if rect and rect.width > 0 and rect.height > 0:
+            self.new_rects.append(rect)
+
+    def extend(self, rects):
+        for rect in rects:
+            self.add(rect)
+
+    def present(self):
+        if self.full_redraw:
+            pygame.display.update()
+        else:
+            rects = merge_rects(self.old_rects + self.new_rects)
+            dirty_area = sum(rect.width * rect.height for rect in rects)
+            screen_area = self.background.get_width() * self.background.get_height()
+            if dirty_area > screen_area * self.max_dirty_ratio:
+                pygame.display.update()
+            else:
+                pygame.display.update(rects)
+
+        self.old_rects = self.new_rects
+        self.new_rects = []
+        self.full_redraw = False
+
+
+# ------------------------------------------------------------
+#                       LRU CACHE
+# ------------------------------------------------------------
+class LRUCache:
+    def __init__(self, max_size, size=None):
+        # size(value) -> what an entry counts against max_size, 1 per entry by default.
+        # The newest entry is always kept, even when it is bigger than max_size on its own.
+        self.max_size = max_size
+        self.size = size
+        self.entries = OrderedDict()  # Oldest first, for LRU eviction
+        self.used = 0
+
+    def get(self, key):
+        # None when missing, a hit counts as a use
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.used -= self._size(old)
+        self.entries[key] = value
+        self.used += self._size(value)
+        while self.used > self.max_size and len(self.entries) > 1:
+            _, old = self.entries.popitem(last=False)
+            self.used -= self._size(old)
+
+    def _size(self, value):
+        return 1 if self.size is None else self.size(value)
+
+    def clear(self):
+        self.entries.clear()
+        self.used = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+
+# ------------------------------------------------------------
+#                      TEXT CACHE
+# ------------------------------------------------------------
+class TextCache:
+    def __init__(self, max_entries=256):
+        self.surfaces = LRUCache(max_entries)
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, antialias, color):
+        # Same arguments as Font.render, but every string is rasterized once
+        key = (font, text, antialias, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self.surfaces.put(key, surface)
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+
+
+# ------------------------------------------------------------
+#                     SCREEN CACHE
+# ------------------------------------------------------------
+class ScreenCache:
+    def __init__(self, max_screens=4):
+        self.screens = LRUCache(max_screens)  # name -> (key, surface)
+        self.presented = None  # (name, key) that is on the display right now
+
+    def present(self, win, name, key, render):
+        # key holds everything the screen depends on, render(surface) draws it
+        entry = self.screens.get(name)
+        if entry is None or entry[0] != key:
+            surface = entry[1] if entry else pygame.Surface(win.get_size(), 0, win)
+            render(surface)
+            entry = (key, surface)
+            self.screens.put(name, entry)
+
+        # Nothing changed since the last present, leave the display alone
+        if self.presented == (name, key):
+            return False
+
+        win.blit(entry[1], (0, 0))
+        pygame.display.update()
+        self.presented = (name, key)
+        return True
+
+    def invalidate(self):
+        # Something else drew on the display
+        self.presented = None
+
+
+# ------------------------------------------------------------
+#                    ROTATION CACHE
+# ------------------------------------------------------------
+def surface_bytes(surface):
+    return surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+
+class RotationCache:
+    def __init__(self, angle_step=2, max_bytes=32 * 1024 * 1024):
+        # Angles are snapped to angle_step degrees, so each (frame, angle)
+        # pair is rotated only once
+        self.angle_step = angle_step
+        self.steps = max(1, int(round(360 / angle_step)))
+        self.surfaces = LRUCache(max_bytes, surface_bytes)
+
+    def get(self, frame, angle):
+        index = int(round(angle / self.angle_step)) % self.steps
+        key = (frame, index)
+        rotated = self.surfaces.get(key)
+        if rotated is None:
+            rotated = pygame.transform.rotate(frame, index * self.angle_step)
+            self.surfaces.put(key, rotated)
+        return rotated
+
+    def clear(self):
+        self.surfaces.clear()
+
+
+# ------------------------------------------------------------
+#                   SPRITE VARIANTS
+# ------------------------------------------------------------
+class SpriteVariantCache:
+    def __init__(self):
+        # Variants are dropped together with the sprite they were made from
+        self.variants = weakref.WeakKeyDictionary()
+
+    def _get(self, surface, key, build):
+        variants = self.variants.get(surface)
+        if variants is None:
+            variants = {}
+            self.variants[surface] = variants
+        variant = variants.get(key)
+        if variant is None:
+            variant = build()
+            variants[key] = variant
+        return variant
+
+    def flipped(self, surface, flip_x=True, flip_y=False):
+        return self._get(surface, ("flip", flip_x, flip_y),
+                         lambda: pygame.transform.flip(surface, flip_x, flip_y))
+
+    def tinted(self, surface, color):
+        # Blend a translucent RGBA color over the sprite
+        def build():
+            variant = surface.copy()
+            overlay = pygame.Surface(surface.get_size(), pygame.SRCALPHA)
+            overlay.fill(color)
+            variant.blit(overlay, (0, 0))
+            return variant
+        return self._get(surface, ("tint", tuple(color)), build)
+
+    def multiplied(self, surface, color):
+        # Multiply every pixel by color, keeps transparent areas transparent
+        def build():
+            variant = surface.copy()
+            variant.fill(color, special_flags=pygame.BLEND_RGBA_MULT)
+            return variant
+        return self._get(surface, ("mult", tuple(color)), build)
+
+    def grayscale(self, surface):
+        return self._get(surface, ("gray",), lambda: pygame.transform.grayscale(surface))
+
+
+# ------------------------------------------------------------
+#                     SURFACE POOL
+# ------------------------------------------------------------
+class SurfacePool:
+    def __init__(self):
+        self.free = {}  # (size, flags) -> surfaces nobody is using
+        self.created = 0
+
+    def borrow(self, size, flags=0):
+        # Contents are left over from the last user, clear before drawing
+        key = (tuple(size), flags & pygame.SRCALPHA)
+        free = self.free.get(key)
+        if free:
+            return free.pop()
+        self.created += 1
+        return pygame.Surface(size, flags)
+
+    def release(self, surface, flags=0):
+        # flags must be the ones it was borrowed with: set_alpha() also turns on
+        # SRCALPHA in get_flags(), so the surface can't tell which list it belongs in
+        key = (surface.get_size(), flags & pygame.SRCALPHA)
+        if not key[1]:
+            surface.set_alpha(None)  # The next user expects a plain surface
+        self.free.setdefault(key, []).append(surface)
+
+    @contextmanager
+    def scratch(self, size, flags=0):
+        surface = self.borrow(size, flags)
+        try:
+            yield surface
+        finally:
+            self.release(surface, flags)
+
+
+# ------------------------------------------------------------
+#                     SPRITE ATLAS
+# ------------------------------------------------------------
+def source_hash(path):
+    # Identifies the source PNG an atlas entry was built from
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class SpriteAtlas:
+    def __init__(self, index_path):
+        # Built by build_atlas.py, a missing atlas just means every lookup misses
+        self.sheet = None
+        self.rects = {}
+        self.sources = {}  # name -> [file, sha1] of the PNG it was packed from
+        self.fresh = {}  # name -> whether the source still matches, checked on first use
+        self.directory = os.path.dirname(index_path)
+        if not os.path.exists(index_path):
+            return
+        try:
+            with open(index_path, "r") as f:
+                index = json.load(f)
+            image_path = os.path.join(self.directory, index["image"])
+            self.sheet = pygame.image.load(image_path).convert_alpha()
+            self.rects = {name: pygame.Rect(rect) for name, rect in index["sprites"].items()}
+            self.sources = index.get("sources", {})
+        except Exception as e:
+            print(f"Could not load sprite atlas: {e}. Loading single sprites.")
+            self.sheet = None
+            self.rects = {}
+
+    def get(self, name, size=None):
+        # Subsurface shares pixels with the sheet, so blits stay on one texture
+        rect = self.rects.get(name)
+        if rect is None or (size is not None and rect.size != tuple(size)) or not self._is_fresh(name):
+            return None
+        return self.sheet.subsurface(rect)
+
+    def _is_fresh(self, name):
+        # An edited source PNG wins over its old copy in the atlas
+        fresh = self.fresh.get(name)
+        if fresh is None:
+            source = self.sources.get(name)
+            try:
+                fresh = source is not None and source_hash(os.path.join(self.directory, source[0])) == source[1]
+            except OSError:
+                fresh = False
+            if not fresh:
+                print(f"Sprite atlas is out of date for {name}, loading the single file. Run build_atlas.py to update it.")
+            self.fresh[name] = fresh
+        return fresh
+
+
+# ------------------------------------------------------------
+#                    CIRCLE SPRITES
+# ------------------------------------------------------------
+class CircleSpriteCache:
+    # Particle circles per (palette color, radius), in a table that grows with the palette.
+    # Colorkeyed instead of per-pixel alpha, those blits are a lot cheaper.
+    KEY_COLOR = (255, 0, 255)
+
+    def __init__(self, max_radius=16):
+        self.max_radius = max_radius  # Bigger particles are drawn at this radius
+        self.table = np.empty((0, max_radius + 1), dtype=object)  # [color id, radius] -> Surface or None
+
+    def lookup(self, palette, color_ids, radii):
+        # Sprites for all particles at once: object array of Surfaces, same length as color_ids
+        if len(self.table) < len(palette):
+            grown = np.empty((len(palette), self.max_radius + 1), dtype=object)
+            grown[:len(self.table)] = self.table
+            self.table = grown
+        radii = np.minimum(radii, self.max_radius)
+        sprites = self.table[color_ids, radii]
+        missing = np.equal(sprites, None)
+        if missing.any():
+            for color_id, radius in set(zip(color_ids[missing].tolist(), radii[missing].tolist())):
+                self.table[color_id, radius] = self._draw(palette[color_id], radius)
+            sprites = self.table[color_ids, radii]
+        return sprites
+
+    def _draw(self, color, radius):
+        key = self.KEY_COLOR if tuple(color) != self.KEY_COLOR else (0, 0, 0)  # Not the circle's own color
+        sprite = pygame.Surface((radius * 2, radius * 2))
+        sprite.fill(key)
+        pygame.draw.circle(sprite, color, (radius, radius), radius)
+        sprite.set_colorkey(key, pygame.RLEACCEL)
+        return sprite.convert() if pygame.display.get_surface() else sprite
+
+    def clear(self):
+        self.table = np.empty((0, self.max_radius + 1), dtype=object)
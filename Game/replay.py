@@ -0,0 +1,146 @@
+import struct
+import sys
+import time
+import zlib
+
+import core
+
+# ------------------------------------------------------------
+#                      REPLAY FORMAT
+# ------------------------------------------------------------
+# A game is fully decided by its seed, its settings and the input of every
+# simulation tick, so that is all a replay stores. Little endian:
+#   header  magic "THRP", version, seed, time_limit, sim_rate, boss width, boss height,
+#           mode and difficulty as length-prefixed utf-8
+#   inputs  number of runs, then (ticks, input mask) per run; input rarely changes between ticks
+#   footer  total ticks and a checksum of the final state, to spot desyncs
+REPLAY_MAGIC = b"THRP"
+REPLAY_VERSION = 1
+HEADER = struct.Struct("<4sHIIHHH")
+RUN = struct.Struct("<HB")
+COUNT = struct.Struct("<I")
+FOOTER = struct.Struct("<II")
+MAX_RUN = 0xFFFF
+
+
+def state_checksum(state):
+    # Everything a desync would show up in sooner or later
+    player = state.player
+    boss = state.boss
+    fields = (state.score, state.level, state.combo, state.health, len(state.items), len(state.obstacles),
+              round(player.x, 3), round(player.y, 3), state.over,
+              boss.hp if boss else None, len(boss.projectiles) if boss else None)
+    return zlib.crc32(repr(fields).encode())
+
+
+def _pack_text(text):
+    data = text.encode("utf-8")
+    return bytes([len(data)]) + data
+
+
+def _unpack_text(data, offset):
+    length = data[offset]
+    return data[offset + 1:offset + 1 + length].decode("utf-8"), offset + 1 + length
+
+
+class Replay:
+    def __init__(self, seed, mode, difficulty, time_limit, sim_rate, boss_size=core.BOSS_SIZE,
+                 runs=None, ticks=0, checksum=None):
+        self.seed = seed
+        self.mode = mode
+        self.difficulty = difficulty
+        self.time_limit = time_limit
+        self.sim_rate = sim_rate
+        self.boss_size = tuple(boss_size)
+        self.runs = runs if runs is not None else []  # [ticks, input mask]
+        self.ticks = ticks
+        self.checksum = checksum  # Of the final state, None while recording
+
+    # ---- Recording ----
+    def record(self, inputs):
+        # One simulation tick
+        runs = self.runs
+        if runs and runs[-1][1] == inputs and runs[-1][0] < MAX_RUN:
+            runs[-1][0] += 1
+        else:
+            runs.append([1, inputs])
+        self.ticks += 1
+
+    def finish(self, state):
+        self.checksum = state_checksum(state)
+
+    # ---- Playback ----
+    def inputs(self):
+        # Input mask of every tick, in order
+        for count, mask in self.runs:
+            for _ in range(count):
+                yield mask
+
+    def new_game(self, pregen=None):
+        # The GameState this replay was recorded from. Achievements are a fresh copy,
+        # a replay never unlocks anything for real.
+        return core.GameState(self.mode, self.time_limit, self.difficulty, seed=self.seed,
+                              boss_size=self.boss_size, pregen=pregen)
+
+    # ---- File format ----
+    def to_bytes(self):
+        parts = [HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, self.seed, self.time_limit, self.sim_rate,
+                             self.boss_size[0], self.boss_size[1]),
+                 _pack_text(self.mode), _pack_text(self.difficulty),
+                 COUNT.pack(len(self.runs))]
+        parts.extend(RUN.pack(count, mask) for count, mask in self.runs)
+        parts.append(FOOTER.pack(self.ticks, self.checksum or 0))
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, seed, time_limit, sim_rate, boss_width, boss_height = HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC:
+            raise ValueError("Not a replay file")
+        if version != REPLAY_VERSION:
+            raise ValueError(f"Replay version {version} is not supported (expected {REPLAY_VERSION})")
+        offset = HEADER.size
+        mode, offset = _unpack_text(data, offset)
+        difficulty, offset = _unpack_text(data, offset)
+        (run_count,) = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        runs = [list(run) for run in RUN.iter_unpack(data[offset:offset + run_count * RUN.size])]
+        offset += run_count * RUN.size
+        ticks, checksum = FOOTER.unpack_from(data, offset)
+        return cls(seed, mode, difficulty, time_limit, sim_rate, (boss_width, boss_height), runs, ticks, checksum)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+def play(replay, on_step=None):
+    # Run a replay as fast as possible without rendering.
+    # on_step(state) is called after every tick. Returns the final GameState.
+    state = replay.new_game()
+    dt = 1 / replay.sim_rate
+    for inputs in replay.inputs():
+        core.step(state, inputs, dt)
+        if on_step:
+            on_step(state)
+    return state
+
+
+if __name__ == "__main__":
+    # python replay.py <file>: play a replay headless and check it against the recorded result
+    if len(sys.argv) != 2:
+        print("Usage: python replay.py <replay file>")
+        sys.exit(2)
+    replay = Replay.load(sys.argv[1])
+    print(f"Replay: {replay.mode}, {replay.difficulty}, seed {replay.seed}, {replay.ticks} ticks "
+          f"({replay.ticks / replay.sim_rate:.1f}s)")
+    start = time.perf_counter()
+    state = play(replay)
+    elapsed = time.perf_counter() - start
+    print(f"Score {state.score}, level {state.level}, ended: {state.over or 'quit'}")
+    print(f"Played in {elapsed:.2f}s ({replay.ticks / max(elapsed, 1e-9):.0f} ticks/s)")
+    if state_checksum(state) != replay.checksum:
+        print("DESYNC: final state does not match the recording")
+        sys.exit(1)
+    print("Final state matches the recording")
@@ -0,0 +1,85 @@
+import pygame
+
+
+# ------------------------------------------------------------
+#                     SPATIAL HASH
+# ------------------------------------------------------------
+# Uniform grid of cell_size x cell_size buckets. Every object is registered
+# in all cells its rect touches, so a rect query only looks at nearby objects.
+# Objects are tracked by identity, so unhashable things (Rects, lists, dicts) work.
+class SpatialHash:
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.cells = {}  # (cx, cy) -> {id(obj): obj}
+        self.entries = {}  # id(obj) -> (obj, rect, cells)
+
+    def _cells_for(self, rect):
+        size = self.cell_size
+        left = rect.left // size
+        top = rect.top // size
+        right = (rect.right - 1) // size
+        bottom = (rect.bottom - 1) // size
+        return [(cx, cy) for cx in range(left, right + 1) for cy in range(top, bottom + 1)]
+
+    def insert(self, obj, rect=None):
+        # rect defaults to obj itself, for objects that are Rects
+        key = id(obj)
+        if key in self.entries:
+            self.remove(obj)
+        rect = pygame.Rect(obj if rect is None else rect)
+        cells = self._cells_for(rect)
+        for cell in cells:
+            bucket = self.cells.get(cell)
+            if bucket is None:
+                bucket = {}
+                self.cells[cell] = bucket
+            bucket[key] = obj
+        self.entries[key] = (obj, rect, cells)
+
+    def remove(self, obj):
+        entry = self.entries.pop(id(obj), None)
+        if entry is None:
+            return False
+        for cell in entry[2]:
+            bucket = self.cells[cell]
+            del bucket[id(obj)]
+            if not bucket:
+                del self.cells[cell]
+        return True
+
+    def move(self, obj, rect=None):
+        rect = pygame.Rect(obj if rect is None else rect)
+        entry = self.entries.get(id(obj))
+        if entry is not None and self._cells_for(rect) == entry[2]:
+            # Still in the same cells, only the stored rect changes
+            entry[1].update(rect)
+            return
+        self.insert(obj, rect)
+
+    def query(self, rect):
+        # Objects whose rect overlaps rect, in no particular order
+        found = {}
+        for cell in self._cells_for(pygame.Rect(rect)):
+            bucket = self.cells.get(cell)
+            if bucket:
+                found.update(bucket)
+        return [obj for key, obj in found.items() if self.entries[key][1].colliderect(rect)]
+
+    def collides(self, rect):
+        return bool(self.query(rect))
+
+    def rebuild(self, objects, get_rect=None):
+        # get_rect(obj) gives the rect for objects that are not Rects themselves
+        self.clear()
+        for obj in objects:
+            self.insert(obj, get_rect(obj) if get_rect else None)
+
+    def clear(self):
+        self.cells.clear()
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, obj):
+        return id(obj) in self.entries
@@ -0,0 +1,322 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+
+# ------------------------------------------------------------
+#                    WRITE-BEHIND FILES
+# ------------------------------------------------------------
+# Saves files on a background thread so the game never waits for the disk.
+# Only the newest data per path is kept, so a burst of saves becomes one write.
+# Every write goes to a temp file that is fsynced and then os.replace()d over the
+# old one: after a crash the file is either the old or the new version, never half.
+# The writer waits batch_delay after the first save so one batch (and one fsync
+# of the directory) covers everything saved around the same time.
+# Missing directories are created, remove() deletes a file the same way.
+class AsyncFileWriter:
+    def __init__(self, batch_delay=0.5, tracer=None):
+        self.batch_delay = batch_delay
+        self.tracer = tracer  # Optional tracing.Tracer, every write shows up as a span
+        self.pending = {}  # path -> data, the newest version not written yet
+        self.condition = threading.Condition()
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name="file-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, path, data):
+        # data: bytes or str, or a callable returning one (encoded on the writer thread).
+        # A callable must not read state the game keeps changing, pass it a snapshot.
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("AsyncFileWriter is closed")
+            self.pending[path] = data
+            self.condition.notify_all()
+
+    def remove(self, path):
+        # Delete path in the background, a later write() of the same path wins again
+        self.write(path, None)
+
+    def write_json(self, path, obj, indent=None):
+        # obj is encoded on the writer thread, hand over a copy the game won't change
+        self.write(path, lambda: json.dumps(obj, indent=indent) + "\n")
+
+    def close(self, timeout=5):
+        # Write what is left and stop the thread
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending or self.closed)
+                if not self.pending:
+                    return  # Closed and nothing left
+                # Let more saves come in, unless the game is closing
+                self.condition.wait_for(lambda: self.closed, self.batch_delay)
+                batch, self.pending = self.pending, {}
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        directories = set()
+        for path, data in batch.items():
+            start = time.perf_counter_ns()
+            try:
+                directory = os.path.dirname(os.path.abspath(path))
+                if data is None:
+                    if os.path.exists(path):
+                        os.remove(path)
+                else:
+                    if callable(data):
+                        data = data()
+                    if isinstance(data, str):
+                        data = data.encode("utf-8")
+                    os.makedirs(directory, exist_ok=True)
+                    tmp_path = path + ".tmp"
+                    with open(tmp_path, "wb") as f:
+                        f.write(data)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(tmp_path, path)
+                directories.add(directory)
+            except Exception as e:
+                print(f"Saving {path} failed: {e}")
+            if self.tracer is not None:
+                self.tracer.complete("write " + os.path.basename(path), "io", start, time.perf_counter_ns() - start)
+        # The rename itself is only durable once the directory is synced, once per batch is enough
+        if hasattr(os, "O_DIRECTORY"):
+            for directory in directories:
+                try:
+                    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+                    try:
+                        os.fsync(fd)
+                    finally:
+                        os.close(fd)
+                except OSError:
+                    pass
+
+
+# ------------------------------------------------------------
+#                       HIGHSCORES
+# ------------------------------------------------------------
+# highscore.json is read once; after that every lookup comes from memory and
+# changes are saved through the AsyncFileWriter.
+# Keys: "60", "120", "300" (time attack seconds, best score) and "endless" (best level).
+class HighscoreStore:
+    def __init__(self, path, writer):
+        self.path = path
+        self.writer = writer
+        self.scores = {}
+        self.version = 0  # Goes up on every change, for caches of the highscore screen
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r") as f:
+                self.scores = json.load(f)
+        except FileNotFoundError:
+            self.scores = {}
+        except (OSError, ValueError) as e:
+            print(f"Could not read highscores: {e}")
+            self.scores = {}
+        self.version += 1
+
+    @staticmethod
+    def key(mode, time_limit):
+        return "endless" if mode == "endless" else str(time_limit)
+
+    def get(self, key):
+        return self.scores.get(key, 0)
+
+    def submit(self, key, value):
+        # Returns True when value is a new highscore for key
+        if value <= self.get(key):
+            return False
+        self.scores[key] = value
+        self.version += 1
+        self.writer.write_json(self.path, dict(self.scores))
+        return True
+
+
+# ------------------------------------------------------------
+#                      ACHIEVEMENTS
+# ------------------------------------------------------------
+# achievements.json: {"achievements": {key: {"name", "desc", "unlocked", "rule"}}, "total_coins_collected": n}.
+# Older files hold only the achievements dict, they are read the same way.
+# Entries in the file can define new achievements; entries without a rule get the default one.
+# achievements is changed in place by the game; save() hands a snapshot to the
+# writer, so unlocking several achievements in one frame still means one write.
+class AchievementStore:
+    def __init__(self, path, writer, defaults):
+        self.path = path
+        self.writer = writer
+        self.achievements = {}
+        self.total_coins_collected = 0
+        self.saved = None  # Last snapshot handed to the writer
+        self.load(defaults)
+
+    def load(self, defaults):
+        data = {}
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Could not read achievements: {e}")
+        if isinstance(data.get("achievements"), dict):
+            self.achievements = data["achievements"]
+            self.total_coins_collected = data.get("total_coins_collected", 0)
+        else:
+            self.achievements = data
+        # Ensure all default achievements exist
+        for key, value in defaults.items():
+            if key not in self.achievements:
+                self.achievements[key] = dict(value)
+            elif "rule" not in self.achievements[key] and "rule" in value:
+                self.achievements[key]["rule"] = value["rule"]
+        self.saved = self.snapshot()
+
+    def snapshot(self):
+        return {"achievements": {key: dict(value) for key, value in self.achievements.items()},
+                "total_coins_collected": self.total_coins_collected}
+
+    def save(self):
+        # Nothing is written when nothing changed since the last save
+        snapshot = self.snapshot()
+        if snapshot == self.saved:
+            return
+        self.saved = snapshot
+        self.writer.write_json(self.path, snapshot, indent=2)  # Indented, the rules are edited by hand
+
+
+# ------------------------------------------------------------
+#                       RUN HISTORY
+# ------------------------------------------------------------
+# Every finished run in a SQLite database (WAL mode). The connection lives on a
+# background thread: record() and the leaderboard queries are queued to it, so
+# the game never touches the database itself. Leaderboards are cached in memory,
+# top() answers from the cache and asks the thread to (re)load what is missing.
+# Time attack is ranked by score per time limit, endless by level reached.
+RUN_FIELDS = ("mode", "time_limit", "difficulty", "score", "level", "max_combo", "coins", "duration",
+              "ended_at", "seed", "reason")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    mode TEXT NOT NULL,
+    time_limit INTEGER NOT NULL,
+    difficulty TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    max_combo INTEGER NOT NULL,
+    coins INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    ended_at REAL NOT NULL,
+    seed INTEGER NOT NULL,
+    reason TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_time_attack_top ON runs (mode, time_limit, difficulty, score DESC, level);
+CREATE INDEX IF NOT EXISTS runs_endless_top ON runs (mode, difficulty, level DESC, score DESC);
+"""
+
+
+class RunHistory:
+    def __init__(self, path, top_n=5):
+        self.path = path
+        self.top_n = top_n
+        self.leaderboards = {}  # (mode, time_limit, difficulty) -> [(score, level), ...] best first
+        self.loading = set()  # Leaderboards requested but not loaded yet
+        self.version = 0  # Goes up when a leaderboard changes, for caches of the highscore screen
+        self.lock = threading.Lock()
+        self.tasks = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="run-history", daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def key(mode, time_limit, difficulty):
+        # Endless runs share one leaderboard whatever the time limit was
+        return (mode, 0 if mode == "endless" else time_limit, difficulty)
+
+    def record(self, **run):
+        # run: every name in RUN_FIELDS except ended_at
+        run["ended_at"] = time.time()
+        if run["mode"] == "endless":
+            run["time_limit"] = 0
+        self.tasks.put(("record", tuple(run[field] for field in RUN_FIELDS)))
+
+    def top(self, mode, time_limit, difficulty):
+        # Best runs as [(score, level)], [] until the thread has loaded them
+        key = self.key(mode, time_limit, difficulty)
+        with self.lock:
+            rows = self.leaderboards.get(key)
+            if rows is None and key not in self.loading:
+                self.loading.add(key)
+                self.tasks.put(("top", key))
+        return rows or []
+
+    def close(self, timeout=5):
+        self.tasks.put(None)
+        self.thread.join(timeout)
+
+    # ---- Database thread ----
+    def _run(self):
+        try:
+            db = sqlite3.connect(self.path)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")  # Durable at checkpoints, enough for a score list
+            db.executescript(SCHEMA)
+        except sqlite3.Error as e:
+            print(f"Run history unavailable: {e}")
+            return
+        while True:
+            task = self.tasks.get()
+            # Everything already queued goes into one transaction
+            tasks = [task]
+            while task is not None:
+                try:
+                    task = self.tasks.get_nowait()
+                except queue.Empty:
+                    break
+                tasks.append(task)
+            closing = tasks[-1] is None
+            try:
+                self._handle(db, [task for task in tasks if task is not None])
+            except sqlite3.Error as e:
+                print(f"Run history error: {e}")
+            if closing:
+                db.close()
+                return
+
+    def _handle(self, db, tasks):
+        runs = [task[1] for task in tasks if task[0] == "record"]
+        reload = {task[1] for task in tasks if task[0] == "top"}
+        if runs:
+            with db:
+                db.executemany(f"INSERT INTO runs ({', '.join(RUN_FIELDS)}) VALUES ({', '.join('?' * len(RUN_FIELDS))})",
+                               runs)
+            # Leaderboards with a new run in them are out of date
+            with self.lock:
+                for run in runs:
+                    key = self.key(run[0], run[1], run[2])
+                    if key in self.leaderboards:
+                        reload.add(key)
+        for key in reload:
+            rows = self._query_top(db, *key)
+            with self.lock:
+                self.leaderboards[key] = rows
+                self.loading.discard(key)
+                self.version += 1
+
+    def _query_top(self, db, mode, time_limit, difficulty):
+        if mode == "endless":
+            sql = ("SELECT score, level FROM runs WHERE mode = ? AND difficulty = ? "
+                   "ORDER BY level DESC, score DESC LIMIT ?")
+            return db.execute(sql, (mode, difficulty, self.top_n)).fetchall()
+        sql = ("SELECT score, level FROM runs WHERE mode = ? AND time_limit = ? AND difficulty = ? "
+               "ORDER BY score DESC LIMIT ?")
+        return db.execute(sql, (mode, time_limit, difficulty, self.top_n)).fetchall()
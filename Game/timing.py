@@ -0,0 +1,45 @@
+import time
+
+
+FRAME_DT = 1 / 60  # Game time of one frame when the clock runs at a fixed step (benchmarks)
+
+
+# ------------------------------------------------------------
+#                        GAME CLOCK
+# ------------------------------------------------------------
+# The only place the front end reads the time. tick() samples a monotonic
+# source once per frame; everything else uses the values from that sample.
+#   real_time   seconds since the clock was made, keeps running while paused (menus)
+#   delta       game seconds the last tick added, what the frame should simulate
+# Game time itself is GameState.time, the sum of the simulated steps, so
+# animations follow the simulation in replays as well.
+class GameClock:
+    def __init__(self, max_delta=0.25, source=time.perf_counter):
+        self.source = source
+        self.max_delta = max_delta  # A longer frame counts as max_delta, so a hitch can't snowball
+        self.paused = False
+        self.start = source()
+        self.last = self.start
+        self.real_time = 0.0
+        self.frame_time = 0.0  # Real seconds the last frame took
+        self.delta = 0.0
+
+    def tick(self, fixed_delta=None):
+        # fixed_delta: make delta exactly this much however long the frame took (benchmarks)
+        now = self.source()
+        self.frame_time = now - self.last
+        self.last = now
+        self.real_time = now - self.start
+        if self.paused:
+            self.delta = 0.0
+        elif fixed_delta is not None:
+            self.delta = fixed_delta
+        else:
+            self.delta = min(self.frame_time, self.max_delta)
+        return self.delta
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
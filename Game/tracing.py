@@ -0,0 +1,132 @@
+import gc
+import json
+import os
+import queue
+import threading
+import time
+
+perf_counter_ns = time.perf_counter_ns
+
+
+# ------------------------------------------------------------
+#                      FRAME TRACE
+# ------------------------------------------------------------
+# Writes spans and instant events in Chrome Trace Event format, to open in
+# chrome://tracing or ui.perfetto.dev. The file is a JSON array with one event
+# per line and no closing "]", which both viewers accept, so a trace of a crashed
+# session is still readable and every line can also be read as JSON on its own.
+# The game thread only appends tuples to a list; encoding and writing happens on
+# a background thread, a batch every flush_interval seconds. Other threads (file
+# writer, GC callbacks) append too, so the list is only touched under self.lock.
+class Tracer:
+    def __init__(self, flush_interval=0.5, max_buffer=20000):
+        self.enabled = False
+        self.path = None
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer  # Flush early when this many events are waiting
+        self.events = []
+        self.lock = threading.RLock()  # Reentrant: a GC callback can fire while this thread holds it
+        self.start_ns = 0
+        self.last_flush = 0
+        self.queue = None
+        self.writer = None
+        self.gc_start = {}  # thread id -> ns, the GC callback runs on whichever thread allocates
+
+    def start(self, path):
+        if self.enabled:
+            self.stop()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.events = []
+        self.start_ns = self.last_flush = perf_counter_ns()
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self._write_loop, args=(path, self.queue),
+                                       name="trace-writer", daemon=True)
+        self.writer.start()
+        self.enabled = True
+        self.name_thread("main")
+        gc.callbacks.append(self._gc_callback)
+        print(f"Tracing to {path}")
+
+    def stop(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        if self._gc_callback in gc.callbacks:
+            gc.callbacks.remove(self._gc_callback)
+        self.flush()
+        self.queue.put(None)
+        self.writer.join()
+        self.writer = None
+        self.queue = None
+        self.gc_start.clear()
+        print(f"Trace saved: {self.path}")
+
+    # ---- Recording ----
+    def complete(self, name, cat, start_ns, duration_ns, args=None):
+        # A span that already ended, start_ns from perf_counter_ns()
+        if self.enabled:
+            self._add(("X", name, cat, start_ns, duration_ns, threading.get_ident(), args))
+
+    def instant(self, name, cat, args=None):
+        if self.enabled:
+            self._add(("i", name, cat, perf_counter_ns(), 0, threading.get_ident(), args))
+
+    def name_thread(self, name):
+        if self.enabled:
+            self._add(("M", "thread_name", "", self.start_ns, 0, threading.get_ident(), {"name": name}))
+
+    def _add(self, event):
+        with self.lock:
+            self.events.append(event)
+
+    def _gc_callback(self, phase, info):
+        thread = threading.get_ident()
+        now = perf_counter_ns()
+        if phase == "start":
+            self.gc_start[thread] = now
+        else:
+            start = self.gc_start.pop(thread, now)
+            self._add(("X", f"gc gen {info['generation']}", "gc", start, now - start, thread,
+                       {"collected": info["collected"], "uncollectable": info["uncollectable"]}))
+
+    def maybe_flush(self):
+        # Call once per frame, hands the buffer to the writer thread when it is due
+        if not self.enabled:
+            return
+        now = perf_counter_ns()
+        if now - self.last_flush >= self.flush_interval * 1e9 or len(self.events) >= self.max_buffer:
+            self.last_flush = now
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            events, self.events = self.events, []
+        if events:
+            self.queue.put((self.start_ns, events))
+
+    # ---- Writer thread ----
+    @staticmethod
+    def _write_loop(path, batches):
+        pid = os.getpid()
+        with open(path, "w") as f:
+            f.write("[\n")
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    break
+                start_ns, events = batch
+                lines = []
+                for phase, name, cat, ts, duration, tid, args in events:
+                    event = {"name": name, "cat": cat, "ph": phase, "ts": (ts - start_ns) / 1000,
+                             "pid": pid, "tid": tid}
+                    if phase == "X":
+                        event["dur"] = duration / 1000
+                    elif phase == "i":
+                        event["s"] = "t"
+                    if args:
+                        event["args"] = args
+                    lines.append(json.dumps(event) + ",\n")
+                f.write("".join(lines))
+                f.flush()
+